@@ -1,29 +1,79 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from .config import Config
+from .json_provider import FastJSONProvider
+from .cache import Cache
+from .catalog import AlbumCatalog
+from .passwords import PasswordHasher
+from .identity import IdentityCache
+from .health import HealthChecks
+from .static_files import StaticFiles
+from .compression import ResponseCompression
+from .metrics import RequestMetrics
+from .rating_buffer import RatingBuffer
+from .rate_limit import RateLimiter
+from .database import database_uri, engine_options
+from .startup import StartupTimer, log_startup, track_first_request
+import logging
 import os
 
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
+cache = Cache()
+catalog = AlbumCatalog()
+password_hasher = PasswordHasher()
+identity_cache = IdentityCache()
+health_checks = HealthChecks()
+static_files = StaticFiles()
+response_compression = ResponseCompression()
+request_metrics = RequestMetrics()
+rating_buffer = RatingBuffer()
+rate_limiter = RateLimiter()
 
 def create_app():
+    timer = StartupTimer()
+
     # In production, static files are in /app/static
     # In development, they're in ../static relative to this file
-    if os.environ.get('FLASK_ENV') == 'production':
+    production = os.environ.get('FLASK_ENV') == 'production'
+    if production:
         static_folder = '/app/static'
     else:
         static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../frontend/dist')
     
-    app = Flask(__name__, static_folder=static_folder, static_url_path='/')
-    app.config.from_object(Config)
+    with timer.phase('config'):
+        # In production StaticFiles serves the build; Flask's own static
+        # route would otherwise shadow the client-side routes below.
+        app = Flask(__name__, static_folder=None if production else static_folder, static_url_path='/')
+        app.static_folder = static_folder
+        app.json = FastJSONProvider(app)
+        app.config.from_object(Config)
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(app.config)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        app.logger.setLevel(logging.INFO)
 
-    db.init_app(app)
-    migrate.init_app(app, db)
-    jwt.init_app(app)
+    with timer.phase('extensions'):
+        db.init_app(app)
+        with app.app_context():
+            request_metrics.instrument_engine(db.engine)
+        migrate.init_app(app, db)
+        jwt.init_app(app)
+        password_hasher.init_app(app)
+        cache.init_app(app)
+        identity_cache.init_app(app)
+        # after_request hooks run last-registered first, so metrics go
+        # before compression to have their latencies include it
+        request_metrics.init_app(app)
+        response_compression.init_app(app)
+        rate_limiter.init_app(app)
+        rating_buffer.init_app(app)
+
+    with timer.phase('catalog'):
+        catalog.init_app(app)
     
     # Configure CORS for production
     if os.environ.get('FLASK_ENV') == 'production':
@@ -31,48 +81,37 @@ def create_app():
     else:
         CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173", "http://localhost:5174", "http://localhost:5175"]}})
 
-    try:
-        from app.routes import auth_bp, progress_bp, albums_bp, ratings_bp
+    # A broken routes module should stop the app from starting rather than
+    # leave it running with no API.
+    with timer.phase('routes'):
+        from app.routes import auth_bp, progress_bp, albums_bp, ratings_bp, dashboard_bp, recommendations_bp, sync_bp
         app.register_blueprint(auth_bp, url_prefix='/api/auth')
         app.register_blueprint(progress_bp, url_prefix='/api/progress')
         app.register_blueprint(albums_bp, url_prefix='/api/albums')
         app.register_blueprint(ratings_bp, url_prefix='/api/ratings')
-    except Exception as e:
-        print(f"Error importing routes: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    # Add a debug endpoint to test if Flask is running
-    @app.route('/api/health')
-    def health_check():
-        routes = []
-        for rule in app.url_map.iter_rules():
-            routes.append({
-                'endpoint': rule.endpoint,
-                'methods': list(rule.methods),
-                'path': str(rule)
-            })
-        return {
-            'status': 'ok', 
-            'env': os.environ.get('FLASK_ENV', 'not set'),
-            'routes_count': len(routes),
-            'routes': routes
-        }
+        app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+        app.register_blueprint(recommendations_bp, url_prefix='/api/recommendations')
+        app.register_blueprint(sync_bp, url_prefix='/api/sync')
     
+    # /livez, /readyz and the debug-only /api/debug/routes
+    health_checks.init_app(app)
+
     # Serve React app in production
-    if os.environ.get('FLASK_ENV') == 'production':
+    if production:
+        with timer.phase('static'):
+            static_files.init_app(app)
+
         @app.route('/', defaults={'path': ''})
         @app.route('/<path:path>')
         def serve_react_app(path):
             # Don't match API routes
             if path.startswith('api/'):
                 return {'error': 'Not found'}, 404
-            
-            # Check if it's a static file
-            if path and os.path.exists(os.path.join(app.static_folder, path)):
-                return send_from_directory(app.static_folder, path)
-            
-            # For all other routes, return index.html (React Router will handle it)
-            return send_from_directory(app.static_folder, 'index.html')
 
+            # Built files by path; everything else gets index.html
+            # (React Router will handle it)
+            return static_files.serve(path)
+
+    track_first_request(app)
+    log_startup(app, timer)
     return app
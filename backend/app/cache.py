@@ -0,0 +1,429 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheUnavailable(Exception):
+    """The cache backend couldn't be reached; callers treat it as a miss."""
+
+
+def gcra(tat, now, interval, burst):
+    """One step of a token bucket holding `burst` tokens and refilling one
+    every `interval` seconds, kept as the single number GCRA uses: the time
+    at which the bucket will be full again (tat).
+
+    Returns (new_tat, 0.0) if a token was taken, or (None, seconds until
+    one is available) if the bucket is empty.
+    """
+    new_tat = max(tat if tat is not None else now, now) + interval
+    wait = new_tat - now - burst * interval
+    if wait > 0:
+        return None, wait
+    return new_tat, 0.0
+
+
+class LocalBackend:
+    """Per-process LRU. Every worker has its own copy, so invalidating a
+    namespace only reaches the worker (or script) that does it."""
+
+    name = 'local'
+
+    def __init__(self, maxsize):
+        self._data = TTLCache(ttl=float('inf'), maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        return [self._data.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self._data.set(key, value, float('inf') if ttl is None else ttl)
+        return True
+
+    def delete(self, key):
+        self._data.delete(key)
+
+    def incr(self, key, initial):
+        with self._lock:
+            value = int(self._data.get(key, initial)) + 1
+            self._data.set(key, str(value).encode())
+            return value
+
+    def throttle(self, key, interval, burst):
+        with self._lock:
+            now = time.monotonic()
+            tat, wait = gcra(self._data.get(key), now, interval, burst)
+            if tat is not None:
+                self._data.set(key, tat, tat - now)
+            return wait
+
+
+class SharedMemoryBackend:
+    """Fixed-size hash table in a memory-mapped file (under /dev/shm by
+    default), shared by every process on the host that opens the same path.
+
+    The file is split into `slots` slots of `slot_size` bytes. A key lives in
+    one of PROBES consecutive slots starting at its hash; when all of them
+    hold other live keys, the one closest to expiring is replaced. Values
+    that don't fit in a slot aren't stored. Pages are only allocated as
+    slots are written, so the file costs nothing up front.
+    """
+
+    name = 'shared'
+    PROBES = 4
+    # expires_at (wall clock, 0 = empty), key length, value length
+    HEADER = struct.Struct('<dHI')
+
+    def __init__(self, path, slots, slot_size):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        size = slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            # New file, or one laid out with different settings
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # POSIX record locks exclude other processes, the thread lock
+        # other threads of this one
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, mode):
+        with self._lock:
+            fcntl.lockf(self._fd, mode)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _probe(self, key):
+        start = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') % self.slots
+        return [(start + i) % self.slots * self.slot_size for i in range(self.PROBES)]
+
+    def _read_header(self, offset):
+        return self.HEADER.unpack_from(self._map, offset)
+
+    def _find(self, key, now):
+        for offset in self._probe(key):
+            expires_at, key_length, value_length = self._read_header(offset)
+            if expires_at > now and key_length == len(key):
+                start = offset + self.HEADER.size
+                if self._map[start:start + key_length] == key:
+                    return offset, value_length
+        return None, 0
+
+    def _get(self, key, now):
+        offset, value_length = self._find(key, now)
+        if offset is None:
+            return None
+        start = offset + self.HEADER.size + len(key)
+        return self._map[start:start + value_length]
+
+    def _set(self, key, value, ttl, now):
+        if self.HEADER.size + len(key) + len(value) > self.slot_size:
+            return False
+        offset, _ = self._find(key, now)
+        if offset is None:
+            # An empty or expired slot if there is one, else the live entry
+            # expiring soonest
+            offset = min(self._probe(key), key=lambda o: max(self._read_header(o)[0] - now, 0))
+        expires_at = float('inf') if ttl is None else now + ttl
+        self.HEADER.pack_into(self._map, offset, expires_at, len(key), len(value))
+        start = offset + self.HEADER.size
+        self._map[start:start + len(key) + len(value)] = key + value
+        return True
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._locked(fcntl.LOCK_SH):
+            return [self._get(key.encode(), now) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        with self._locked(fcntl.LOCK_EX):
+            return self._set(key.encode(), value, ttl, time.time())
+
+    def delete(self, key):
+        with self._locked(fcntl.LOCK_EX):
+            offset, _ = self._find(key.encode(), time.time())
+            if offset is not None:
+                self.HEADER.pack_into(self._map, offset, 0.0, 0, 0)
+
+    def incr(self, key, initial):
+        key = key.encode()
+        with self._locked(fcntl.LOCK_EX):
+            now = time.time()
+            current = self._get(key, now)
+            value = int(current if current is not None else initial) + 1
+            self._set(key, str(value).encode(), None, now)
+            return value
+
+    def throttle(self, key, interval, burst):
+        key = key.encode()
+        with self._locked(fcntl.LOCK_EX):
+            now = time.time()
+            current = self._get(key, now)
+            tat, wait = gcra(float(current) if current is not None else None, now, interval, burst)
+            if tat is not None:
+                self._set(key, repr(tat).encode(), tat - now, now)
+            return wait
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, or a
+    local stand-in such as fakeredis' TCP server)."""
+
+    name = 'redis'
+
+    # gcra() in Lua, so that reading and updating a bucket is one atomic
+    # step; the server's clock keeps hosts with drifting clocks consistent.
+    # Numbers go back as strings because Redis truncates Lua numbers.
+    THROTTLE_SCRIPT = """
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local interval, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+        local wait = tat - now - burst * interval
+        if wait > 0 then
+            return tostring(wait)
+        end
+        redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+        return '0'
+    """
+
+    def __init__(self, url, timeout):
+        import redis
+
+        self._errors = (redis.RedisError, OSError)
+        # redis-py pools notice a fork and reconnect in the child
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except self._errors as e:
+            raise CacheUnavailable(str(e)) from e
+
+    def get_many(self, keys):
+        return self._call(self._client.mget, keys)
+
+    def set(self, key, value, ttl=None):
+        px = None if ttl is None else max(1, int(ttl * 1000))
+        self._call(self._client.set, key, value, px=px)
+        return True
+
+    def delete(self, key):
+        self._call(self._client.delete, key)
+
+    def incr(self, key, initial):
+        def incr():
+            pipe = self._client.pipeline(transaction=False)
+            pipe.set(key, initial, nx=True)
+            pipe.incr(key)
+            return pipe.execute()[1]
+        return self._call(incr)
+
+    def throttle(self, key, interval, burst):
+        # Plain EVAL: the script is short, the server caches it compiled, and
+        # there's no NOSCRIPT round trip after a restart or failover
+        return float(self._call(self._client.eval, self.THROTTLE_SCRIPT, 1, key, interval, burst))
+
+
+class CacheNamespace:
+    """Keys under one name, e.g. cache.namespace('identity').
+
+    Every entry is stored with the namespace version current when it was
+    written, and a read only counts as a hit if that version is still
+    current, so invalidate() drops the whole namespace in one write. Reads
+    fetch the entry and the version together, in one round trip for Redis.
+
+    Values must be JSON-serializable. Backend failures are logged, counted
+    and treated as misses, so a cache outage only costs the lookups it saved.
+    """
+
+    def __init__(self, cache, name, ttl=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.stats = {
+            'hits': 0, 'misses': 0, 'sets': 0, 'skipped': 0, 'invalidations': 0, 'errors': 0,
+        }
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        if isinstance(key, tuple):
+            key = ':'.join(str(part) for part in key)
+        return f'{self.cache.prefix}:{self.name}:{key}'
+
+    @property
+    def _version_key(self):
+        return f'{self.cache.prefix}:{self.name}:#version'
+
+    def _count(self, event):
+        with self._lock:
+            self.stats[event] += 1
+        self.cache.record(self.name, event)
+
+    def _failed(self, action, e):
+        self._count('errors')
+        self.cache.log_error(f'Cache {action} in {self.name!r} failed: {e}')
+
+    def get(self, key, default=None):
+        try:
+            version, entry = self.cache.backend.get_many([self._version_key, self._key(key)])
+        except (CacheUnavailable, OSError) as e:
+            self._failed('read', e)
+            return default
+        if version is not None and entry is not None:
+            written_version, value = json.loads(entry)
+            if written_version == int(version):
+                self._count('hits')
+                return value
+        self._count('misses')
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            backend = self.cache.backend
+            version = backend.get_many([self._version_key])[0]
+            if version is None:
+                version = self._new_version()
+            entry = json.dumps([int(version), value], separators=(',', ':')).encode()
+            stored = backend.set(self._key(key), entry, ttl)
+        except (CacheUnavailable, OSError) as e:
+            self._failed('write', e)
+            return
+        # False when the shared backend's slots are too small for the value
+        self._count('skipped' if stored is False else 'sets')
+
+    def delete(self, key):
+        try:
+            self.cache.backend.delete(self._key(key))
+        except (CacheUnavailable, OSError) as e:
+            self._failed('delete', e)
+
+    def invalidate(self):
+        """Drop every entry in the namespace, in every process sharing the
+        backend."""
+        try:
+            self._new_version()
+        except (CacheUnavailable, OSError) as e:
+            self._failed('invalidation', e)
+            return
+        self._count('invalidations')
+
+    def _new_version(self):
+        # A version key that was evicted starts again from the clock, never
+        # from 0, so entries written before the eviction can't come back
+        return self.cache.backend.incr(self._version_key, time.time_ns())
+
+
+class Cache:
+    """Cache shared by everything in the app that caches JSON-able values,
+    split into namespaces. CACHE_BACKEND picks where entries live:
+
+      local   per-process LRU (the default; nothing shared)
+      shared  memory-mapped file, shared by the workers on one host
+      redis   Redis-protocol server at CACHE_URL, shared by every host
+    """
+
+    def __init__(self, app=None):
+        self.prefix = 'albums'
+        self.backend = LocalBackend(maxsize=10000)
+        self._namespaces = {}
+        self._logger = None
+        self._logged_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.prefix = config['CACHE_KEY_PREFIX']
+        kind = config['CACHE_BACKEND']
+        if kind == 'local':
+            self.backend = LocalBackend(maxsize=config['CACHE_MAX_ENTRIES'])
+        elif kind == 'shared':
+            self.backend = SharedMemoryBackend(
+                config['CACHE_SHARED_PATH'],
+                config['CACHE_SHARED_SLOTS'],
+                config['CACHE_SHARED_SLOT_SIZE'],
+            )
+        elif kind == 'redis':
+            self.backend = RedisBackend(config['CACHE_URL'], config['CACHE_TIMEOUT'])
+        else:
+            raise ValueError(f'CACHE_BACKEND must be local, shared or redis, not {kind!r}')
+        self._logger = app.logger
+        app.extensions['cache'] = self
+
+    def namespace(self, name, ttl=None):
+        if name not in self._namespaces:
+            self._namespaces[name] = CacheNamespace(self, name, ttl)
+        return self._namespaces[name]
+
+    def record(self, namespace, event):
+        # Hit/miss counters for /metrics, summed over workers there
+        from app import request_metrics
+
+        request_metrics.registry.count_cache_event(namespace, event)
+
+    def log_error(self, message):
+        # At most one warning a minute, or a Redis outage would log one
+        # per request
+        now = time.monotonic()
+        if self._logger and (self._logged_at is None or now - self._logged_at > 60):
+            self._logged_at = now
+            self._logger.warning(message)
+
+    def snapshot(self):
+        return {
+            'backend': self.backend.name,
+            'namespaces': {name: dict(ns.stats) for name, ns in self._namespaces.items()},
+        }
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.json_provider import encode_fragment
+from app.search import SearchIndex
+
+# Albums are seeded once and never edited by the API, so every worker keeps an
+# in-memory copy and only goes back to the database when the seeder bumps the
+# version stamp in the catalog_version table.
+CatalogAlbum = namedtuple(
+    'CatalogAlbum', ['id', 'rank', 'artist', 'album', 'info', 'description']
+)
+ALBUM_FIELDS = frozenset(CatalogAlbum._fields)
+# The short form used in lists of ratings, top-rated albums and so on
+SUMMARY_FIELDS = ('id', 'rank', 'artist', 'album')
+
+
+def album_to_dict(album):
+    return album._asdict()
+
+
+def album_summary(album):
+    return {field: getattr(album, field) for field in SUMMARY_FIELDS}
+
+
+class CatalogSnapshot:
+    __slots__ = (
+        'version', 'albums', 'by_id', 'by_rank', 'etag', 'search_index', 'encoded', 'encoded_summaries',
+    )
+
+    def __init__(self, version, albums):
+        self.version = version
+        # Countdown order: rank 500 first, rank 1 last
+        self.albums = tuple(sorted(albums, key=lambda a: a.rank, reverse=True))
+        self.by_id = {album.id: album for album in self.albums}
+        self.by_rank = {album.rank: album for album in self.albums}
+        # Content hash, so identical data gives identical ETags in every worker
+        digest = hashlib.sha1()
+        for album in self.albums:
+            digest.update(repr(tuple(album)).encode('utf-8'))
+        self.etag = digest.hexdigest()
+        # Built with the snapshot, so it is rebuilt exactly when the catalog
+        # version changes, by the thread doing the reload
+        self.search_index = SearchIndex(self.albums)
+        # Each album's JSON, encoded once here and spliced into responses
+        self.encoded = {album.id: encode_fragment(album_to_dict(album)) for album in self.albums}
+        self.encoded_summaries = {
+            album.id: encode_fragment(album_summary(album)) for album in self.albums
+        }
+
+
+class AlbumCatalog:
+    def __init__(self, app=None):
+        self._snapshot = CatalogSnapshot(None, ())
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._check_interval = 30
+        self._engine_getter = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        self._check_interval = app.config.get('CATALOG_CHECK_INTERVAL', 30)
+        self._engine_getter = lambda: db.engine
+        app.extensions['album_catalog'] = self
+
+        # Build the catalog up front so the first request doesn't pay for it.
+        # The tables may not exist yet (e.g. during `flask db upgrade`), in
+        # which case we fall back to loading on first use.
+        with app.app_context():
+            try:
+                self.reload()
+            except SQLAlchemyError as e:
+                app.logger.warning(f'Album catalog not loaded at startup: {e}')
+
+    @property
+    def snapshot(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self._check_interval:
+            self._refresh(now)
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @property
+    def etag(self):
+        return self.snapshot.etag
+
+    def get(self, album_id):
+        # Ids from JSON bodies: Album.query.get() took "5" as well as 5, and
+        # anything else that isn't an id (lists, true) is simply not found
+        if isinstance(album_id, str) and album_id.isdigit():
+            album_id = int(album_id)
+        elif isinstance(album_id, bool) or not isinstance(album_id, int):
+            return None
+        return self.snapshot.by_id.get(album_id)
+
+    def get_by_rank(self, rank):
+        return self.snapshot.by_rank.get(rank)
+
+    def next_album(self, album):
+        # The countdown moves from higher ranks towards #1
+        return self.snapshot.by_rank.get(album.rank - 1)
+
+    def upcoming(self, album, count):
+        """Up to `count` albums after this one, in countdown order."""
+        by_rank = self.snapshot.by_rank
+        ranks = range(album.rank - 1, max(album.rank - 1 - count, 0), -1)
+        return [by_rank[rank] for rank in ranks if rank in by_rank]
+
+    def all(self):
+        return self.snapshot.albums
+
+    def encoded(self, album, summary=False):
+        """The album as a pre-encoded JSON fragment for jsonify(), in full or
+        in SUMMARY_FIELDS form. Fragments can't be modified or passed to
+        anything other than the app's JSON provider."""
+        # _snapshot: album came from this catalog, which has just refreshed
+        snapshot = self._snapshot
+        if snapshot.by_id.get(album.id) is not album:
+            # From a snapshot that has since been replaced
+            return album_summary(album) if summary else album_to_dict(album)
+        return (snapshot.encoded_summaries if summary else snapshot.encoded)[album.id]
+
+    def search(self, query, limit=10):
+        return self.snapshot.search_index.search(query, limit)
+
+    def __len__(self):
+        return len(self.snapshot.albums)
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def reload(self):
+        with self._engine_getter().connect() as conn:
+            version = self._read_version(conn)
+            rows = conn.execute(
+                text(
+                    'SELECT id, rank, artist, album, info, description FROM albums'
+                )
+            ).all()
+        self._snapshot = CatalogSnapshot(
+            version, [CatalogAlbum(*row) for row in rows]
+        )
+        self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _refresh(self, now):
+        # Only one thread per worker checks the stamp; the others keep using
+        # the current snapshot until the new one is swapped in.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._checked_at < self._check_interval:
+                return
+            with self._engine_getter().connect() as conn:
+                version = self._read_version(conn)
+            if version != self._snapshot.version or not self._snapshot.albums:
+                self.reload()
+            else:
+                self._checked_at = now
+        except SQLAlchemyError:
+            # Keep serving the last good snapshot; try again next interval
+            self._checked_at = now
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _read_version(conn):
+        return conn.execute(
+            text('SELECT version FROM catalog_version WHERE id = 1')
+        ).scalar()
+
@@ -0,0 +1,109 @@
+import gzip
+
+from flask import request
+
+from app.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/csv')
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class ResponseCompression:
+    """Compresses API responses for clients that send Accept-Encoding.
+
+    Responses under COMPRESS_MIN_SIZE bytes go out as they are; the headers
+    would eat most of the saving. Responses that carry an ETag (the album
+    catalog) are identical for every request with that ETag, so their
+    compressed bodies are kept and reused. They are compressed at
+    COMPRESS_LEVEL like everything else: any query parameter makes a new
+    ETag, and brotli's highest quality costs a second of CPU on the catalog.
+    Only bodies passed to precompress() at startup get the highest level.
+
+    Each encoding gets its own ETag, `<etag>-br` or `<etag>-gzip` as for the
+    static files, so caches never take one encoding's body for another's.
+    Views check If-None-Match with etag_matches(), which accepts any of them.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 500
+        self.level = 6
+        self._memo = TTLCache(ttl=3600, maxsize=64)
+        self._precompressed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self._memo = TTLCache(ttl=3600, maxsize=app.config['COMPRESS_CACHE_SIZE'])
+        self._precompressed = {}
+        app.extensions['response_compression'] = self
+        app.after_request(self.compress_response)
+
+    def precompress(self, etag, data):
+        """Compress `data`, the body of responses with this ETag, at the
+        highest level in every encoding, replacing whatever was precompressed
+        before. Slow; meant for startup."""
+        self._precompressed = {
+            (etag, encoding): compress(data, encoding, max_level=True) for encoding in ENCODINGS
+        }
+
+    def compress_response(self, response):
+        if not request.path.startswith('/api/'):
+            return response
+        # Streamed exports and files are sent as they are produced
+        if response.is_streamed or response.direct_passthrough:
+            return response
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._choose_encoding()
+        if encoding is None or (response.content_length or 0) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        if etag:
+            key = (etag, encoding)
+            body = self._precompressed.get(key) or self._memo.get(key)
+            if body is None:
+                body = compress(response.get_data(), encoding, level=self.level)
+                self._memo.set(key, body)
+            response.set_etag(f'{etag}-{encoding}', weak)
+        else:
+            body = compress(response.get_data(), encoding, level=self.level)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _choose_encoding():
+        accepted = request.accept_encodings
+        candidates = [('br', accepted['br'])] if brotli is not None else []
+        candidates.append(('gzip', accepted['gzip']))
+        # Highest q-value wins; brotli on a tie since it compresses better
+        encoding, quality = max(candidates, key=lambda c: c[1])
+        return encoding if quality > 0 else None
+
+
+def compress(data, encoding, level=6, max_level=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if max_level else min(level, 11))
+    return gzip.compress(data, compresslevel=9 if max_level else level, mtime=0)
+
+
+def etag_matches(etag):
+    """The validator in If-None-Match that matches `etag` in any encoding,
+    for the view to send back with its 304, or None."""
+    for candidate in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats:
+    """Counts pool checkouts and how long requests waited for a connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self, pool=None):
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'idle': pool.checkedin(),
+            })
+        return data
+
+
+pool_stats = PoolStats()
+
+# SQLAlchemy names pool loggers after the pool class's module, which puts
+# InstrumentedQueuePool under the Flask app logger ("app") and its INFO level.
+logging.getLogger(__name__).setLevel(logging.WARNING)
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool has no "before checkout" event, so time the checkout itself.
+    # This includes opening a new connection when the pool has to.
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return connection
+
+
+def database_uri(config):
+    if config['CLOUD_SQL_INSTANCE']:
+        # Connections come from the Cloud SQL connector via `creator`
+        return 'postgresql+pg8000://'
+
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    # Newer SQLAlchemy releases map a bare postgresql:// to psycopg 3, but the
+    # driver we install is psycopg2. Heroku-style postgres:// isn't accepted.
+    for prefix in ('postgresql://', 'postgres://'):
+        if uri.startswith(prefix):
+            return 'postgresql+psycopg2://' + uri[len(prefix):]
+    return uri
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured deployment.
+
+    Each gunicorn worker is its own process with its own pool. A request
+    thread holds at most one session connection plus a short-lived one for
+    the catalog check, so the pool is sized from GUNICORN_THREADS. The whole
+    deployment then opens up to
+    GUNICORN_WORKERS * (pool_size + max_overflow) connections per instance.
+    """
+    uri = database_uri(config)
+    if not uri.startswith('postgresql'):
+        return {}
+
+    threads = config['GUNICORN_THREADS']
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'] or threads,
+        'max_overflow': threads if config['DB_MAX_OVERFLOW'] is None else config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        # Cloud SQL and proxies drop idle connections; recycle before they do
+        # and ping on checkout so a dropped one is replaced, not a 500.
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+    if config['CLOUD_SQL_INSTANCE']:
+        options['creator'] = cloud_sql_creator(config)
+    return options
+
+
+def cloud_sql_creator(config):
+    lock = threading.Lock()
+    state = {'pid': None, 'connector': None}
+
+    def creator():
+        # The connector runs a background thread, so it must be created in
+        # the worker process that uses it, never inherited across a fork.
+        with lock:
+            if state['pid'] != os.getpid():
+                from google.cloud.sql.connector import Connector, IPTypes
+
+                ip_type = IPTypes.PRIVATE if config['CLOUD_SQL_PRIVATE_IP'] else IPTypes.PUBLIC
+                state['connector'] = Connector(ip_type=ip_type)
+                state['pid'] = os.getpid()
+            connector = state['connector']
+        return connector.connect(
+            config['CLOUD_SQL_INSTANCE'],
+            'pg8000',
+            user=config['DB_USER'],
+            password=config['DB_PASS'],
+            db=config['DB_NAME'],
+        )
+
+    return creator
+
+
+def install_statement_timeout(app):
+    """DB_STATEMENT_TIMEOUT_MS on the connections serving web requests.
+
+    Called by the servers (gunicorn.conf.py's post_fork, run.py), never by
+    create_app(), so `flask db upgrade`, the seeders and the maintenance
+    scripts can run statements as long as they need.
+    """
+    from app import db
+
+    timeout_ms = app.config['DB_STATEMENT_TIMEOUT_MS']
+    with app.app_context():
+        engine = db.engine
+        if not timeout_ms or engine.dialect.name != 'postgresql':
+            return
+
+        @event.listens_for(engine, 'connect')
+        def set_statement_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'SET statement_timeout = {int(timeout_ms)}')
+            cursor.close()
+            dbapi_connection.commit()
+
+        # Connections create_app() opened, e.g. to load the catalog, have none
+        engine.dispose()
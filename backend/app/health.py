@@ -0,0 +1,123 @@
+import threading
+import time
+
+from flask import current_app, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+from app.database import pool_stats
+
+
+class HealthChecks:
+    """Liveness and readiness probes.
+
+    /livez only proves the worker can answer, so it never touches the
+    database. /readyz pings the database at most once per
+    HEALTH_CHECK_INTERVAL per worker; probes in between, and probes that
+    arrive while another thread is pinging, get the last result.
+    """
+
+    def __init__(self, app=None):
+        self._interval = 5.0
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._database = {'ok': False, 'error': 'not checked yet'}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._interval = app.config['HEALTH_CHECK_INTERVAL']
+        app.extensions['health_checks'] = self
+
+        app.add_url_rule('/livez', 'livez', self.livez)
+        app.add_url_rule('/readyz', 'readyz', self.readyz)
+        # Kept for load balancers still configured with the old path
+        app.add_url_rule('/api/health', 'health_check', self.readyz)
+        app.add_url_rule('/api/debug/routes', 'debug_routes', self.debug_routes)
+
+    def livez(self):
+        return {'status': 'ok'}
+
+    def readyz(self):
+        from app import cache, catalog, db, rating_buffer
+
+        database = self._check_database(db.engine)
+
+        # _snapshot rather than .snapshot, so a loaded catalog is never
+        # reloaded by a probe. An empty one (the load in create_app() failed,
+        # say because the database wasn't up) is retried here, at most once
+        # per CATALOG_CHECK_INTERVAL: unready instances get no API requests
+        # to retry it for them.
+        snapshot = catalog._snapshot
+        if not snapshot.albums:
+            snapshot = catalog.snapshot
+        catalog_status = {
+            'ok': bool(snapshot.albums),
+            'version': snapshot.version,
+            'albums': len(snapshot.albums),
+        }
+
+        pool = db.engine.pool
+        pool_status = pool_stats.snapshot(pool)
+        if isinstance(pool, QueuePool):
+            # Reported, not enforced: a briefly busy pool shouldn't pull the
+            # instance out of rotation.
+            pool_status['saturated'] = (
+                pool.checkedout() >= pool.size() + pool._max_overflow
+            )
+
+        ready = database['ok'] and catalog_status['ok']
+        body = {
+            'status': 'ok' if ready else 'unavailable',
+            'database': database,
+            'catalog': catalog_status,
+            'database_pool': pool_status,
+            'cache': cache.snapshot(),
+        }
+        if rating_buffer.enabled:
+            body['rating_buffer'] = rating_buffer.snapshot()
+        return jsonify(body), 200 if ready else 503
+
+    def debug_routes(self):
+        if not (current_app.debug or current_app.config['DEBUG_ENDPOINTS']):
+            return {'error': 'Not found'}, 404
+
+        routes = [
+            {
+                'endpoint': rule.endpoint,
+                'methods': sorted(rule.methods),
+                'path': str(rule),
+            }
+            for rule in current_app.url_map.iter_rules()
+        ]
+        return {'routes_count': len(routes), 'routes': routes}
+
+    def _check_database(self, engine):
+        now = time.monotonic()
+        if self._is_fresh(now) or not self._lock.acquire(blocking=False):
+            return self._result(now)
+        try:
+            if not self._is_fresh(now):
+                start = time.perf_counter()
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text('SELECT 1'))
+                    self._database = {
+                        'ok': True,
+                        'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+                    }
+                except SQLAlchemyError as e:
+                    self._database = {'ok': False, 'error': type(e).__name__}
+                    current_app.logger.warning(f'Readiness check: database unreachable: {e}')
+                self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+        return self._result(time.monotonic())
+
+    def _is_fresh(self, now):
+        return self._checked_at is not None and now - self._checked_at < self._interval
+
+    def _result(self, now):
+        age = None if self._checked_at is None else round(now - self._checked_at, 3)
+        return {**self._database, 'checked_seconds_ago': age}
@@ -0,0 +1,50 @@
+from flask_jwt_extended import get_jwt
+
+IDENTITY_CLAIMS = ('username', 'email')
+
+
+def identity_claims(user):
+    """Extra JWT claims so token holders can be identified without a lookup.
+
+    Only fields the API never changes go in here. The progress pointer moves
+    on every completed album, so it stays in the database.
+    """
+    return {'username': user.username, 'email': user.email}
+
+
+class IdentityCache:
+    """Resolves a user id to {'id', 'username', 'email'}.
+
+    Tried in order: claims embedded in the current token, the 'identity'
+    namespace of the app cache, and finally the users table. Nothing in the
+    API changes a username or email or deletes a user, so cached entries
+    are only dropped by IDENTITY_CACHE_TTL.
+    """
+
+    def __init__(self, app=None):
+        self._cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import cache
+
+        self._cache = cache.namespace('identity', ttl=app.config['IDENTITY_CACHE_TTL'])
+        app.extensions['identity_cache'] = self
+
+    def get(self, user_id):
+        claims = get_jwt()
+        if all(claim in claims for claim in IDENTITY_CLAIMS):
+            return {'id': user_id, **{claim: claims[claim] for claim in IDENTITY_CLAIMS}}
+
+        identity = self._cache.get(user_id)
+        if identity is None:
+            from app import db
+            from app.models import User
+
+            user = db.session.get(User, user_id)
+            if not user:
+                return None
+            identity = {'id': user.id, 'username': user.username, 'email': user.email}
+            self._cache.set(user_id, identity)
+        return identity
@@ -0,0 +1,56 @@
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # falls back to Flask's stdlib-based provider
+    orjson = None
+
+
+def encode_fragment(obj):
+    """Serialize obj once for splicing into later responses unchanged.
+
+    With orjson this is an orjson.Fragment, which the provider below copies
+    into the output as is. Without it, obj is returned and gets encoded
+    with everything else, so callers don't need to care which they got.
+    """
+    if orjson is None:
+        return obj
+    return orjson.Fragment(orjson.dumps(obj, option=orjson.OPT_SORT_KEYS))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, on orjson when it's installed.
+
+    Output matches the default provider apart from non-ASCII text, which is
+    written as UTF-8 rather than \\u escapes: keys are sorted, dates and
+    other extra types go through Flask's own default() and non-string keys
+    are converted.
+    """
+
+    def _options(self, pretty=False):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if pretty:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # Keyword arguments are stdlib json options orjson doesn't have
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=_default, option=self._options(pretty))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
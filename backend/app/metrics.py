@@ -0,0 +1,324 @@
+import copy
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+try:
+    from pythonjsonlogger import jsonlogger
+except ImportError:  # python-json-logger is only in requirements-prod.txt
+    jsonlogger = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+budget_logger = logging.getLogger('app.query_budget')
+
+
+def _new_histogram(buckets):
+    return {'buckets': [0] * len(buckets), 'count': 0, 'sum': 0}
+
+
+def _observe(histogram, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            histogram['buckets'][i] += 1
+            break
+    histogram['count'] += 1
+    histogram['sum'] += value
+
+
+class MetricsRegistry:
+    """One worker's request and query counters.
+
+    Keys are label tuples joined with '|' so the whole registry can be
+    written to and read back from JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # endpoint|method|status -> latency histogram
+            self.requests = {}
+            # endpoint -> histogram of queries per request
+            self.queries = {}
+            # endpoint -> total seconds spent in the database
+            self.db_seconds = {}
+            # endpoint -> requests over the query budget
+            self.over_budget = {}
+            # namespace|event -> count, from app.cache
+            self.cache = {}
+
+    def record(self, endpoint, method, status, elapsed, query_count, db_seconds, over_budget):
+        with self._lock:
+            key = f'{endpoint}|{method}|{status}'
+            if key not in self.requests:
+                self.requests[key] = _new_histogram(LATENCY_BUCKETS)
+            _observe(self.requests[key], LATENCY_BUCKETS, elapsed)
+
+            if endpoint not in self.queries:
+                self.queries[endpoint] = _new_histogram(QUERY_COUNT_BUCKETS)
+            _observe(self.queries[endpoint], QUERY_COUNT_BUCKETS, query_count)
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + db_seconds
+            if over_budget:
+                self.over_budget[endpoint] = self.over_budget.get(endpoint, 0) + 1
+
+    def count_cache_event(self, namespace, event):
+        with self._lock:
+            key = f'{namespace}|{event}'
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return copy.deepcopy({
+                'requests': self.requests,
+                'queries': self.queries,
+                'db_seconds': self.db_seconds,
+                'over_budget': self.over_budget,
+                'cache': self.cache,
+            })
+
+
+def merge(snapshots):
+    """Add up registry dicts from several workers."""
+    total = {'requests': {}, 'queries': {}, 'db_seconds': {}, 'over_budget': {}, 'cache': {}}
+    for snapshot in snapshots:
+        for section in ('requests', 'queries'):
+            for key, histogram in snapshot.get(section, {}).items():
+                merged = total[section].get(key)
+                if merged is None:
+                    total[section][key] = {
+                        'buckets': list(histogram['buckets']),
+                        'count': histogram['count'],
+                        'sum': histogram['sum'],
+                    }
+                else:
+                    merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+                    merged['count'] += histogram['count']
+                    merged['sum'] += histogram['sum']
+        for section in ('db_seconds', 'over_budget', 'cache'):
+            for key, value in snapshot.get(section, {}).items():
+                total[section][key] = total[section].get(key, 0) + value
+    return total
+
+
+class RequestMetrics:
+    """Per-endpoint latency, SQL query counts and DB time, served at /metrics.
+
+    Each gunicorn worker counts in memory and writes its totals to
+    METRICS_DIR/<pid>-<random>.json at most every METRICS_FLUSH_INTERVAL
+    seconds.
+    /metrics adds up every file there, so whichever worker answers the
+    scrape reports the whole instance. Without METRICS_DIR only the
+    answering worker's own numbers are reported.
+    """
+
+    def __init__(self, app=None):
+        self.registry = MetricsRegistry()
+        self.directory = None
+        self.flush_interval = 5.0
+        self.query_budget = 10
+        self.token = None
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        self._filename = None
+        self._filename_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        self.query_budget = app.config['METRICS_QUERY_BUDGET']
+        self.token = app.config['METRICS_TOKEN']
+        configure_budget_logger()
+
+        app.extensions['request_metrics'] = self
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start_request(self):
+        g.metrics_started_at = time.perf_counter()
+        g.query_count = 0
+        g.db_seconds = 0.0
+
+    def _finish_request(self, response):
+        started_at = g.pop('metrics_started_at', None)
+        if started_at is None:
+            return response
+        elapsed = time.perf_counter() - started_at
+        endpoint = request.endpoint or 'none'
+        query_count = g.get('query_count', 0)
+        db_seconds = g.get('db_seconds', 0.0)
+        over_budget = bool(self.query_budget) and query_count > self.query_budget
+
+        self.registry.record(
+            endpoint, request.method, response.status_code,
+            elapsed, query_count, db_seconds, over_budget,
+        )
+        if over_budget:
+            budget_logger.warning('query budget exceeded', extra={
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'query_count': query_count,
+                'query_budget': self.query_budget,
+                'db_ms': round(db_seconds * 1000, 3),
+                'duration_ms': round(elapsed * 1000, 3),
+                'pid': os.getpid(),
+            })
+
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+        return response
+
+    def flush(self):
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, self._own_filename())
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(self.registry.to_dict(), f)
+            os.replace(f'{path}.tmp', path)
+            self._flushed_at = time.monotonic()
+        except OSError as e:
+            current_app.logger.warning(f'Could not write metrics to {self.directory}: {e}')
+        finally:
+            self._flush_lock.release()
+
+    def _own_filename(self):
+        # Not the bare pid: gunicorn can give a respawned worker the pid of
+        # one that exited, whose file must keep its totals
+        if self._filename_pid != os.getpid():
+            self._filename_pid = os.getpid()
+            self._filename = f'{os.getpid()}-{uuid.uuid4().hex[:12]}.json'
+        return self._filename
+
+    def collect(self):
+        if not self.directory:
+            return self.registry.to_dict()
+
+        self.flush()
+        snapshots = []
+        # Files from workers that have since exited are still counted, so
+        # totals never go backwards within one gunicorn run.
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge(snapshots)
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            return {'error': 'Unauthorized'}, 401
+        return Response(render_prometheus(self.collect()), mimetype='text/plain; version=0.0.4')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started_at')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    # Queries outside a request (startup, CLI scripts) aren't attributed
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+        g.db_seconds += elapsed
+
+
+def configure_budget_logger():
+    if budget_logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    if jsonlogger is not None:
+        handler.setFormatter(jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    budget_logger.addHandler(handler)
+    budget_logger.setLevel(logging.WARNING)
+    budget_logger.propagate = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _render_histogram(lines, name, help_text, bounds, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(bounds, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{_labels(**labels, le=bound)}}} {cumulative}')
+        lines.append(f'{name}_bucket{{{_labels(**labels, le="+Inf")}}} {histogram["count"]}')
+        lines.append(f'{name}_sum{{{_labels(**labels)}}} {histogram["sum"]}')
+        lines.append(f'{name}_count{{{_labels(**labels)}}} {histogram["count"]}')
+
+
+def _render_counter(lines, name, help_text, values):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for endpoint, value in sorted(values.items()):
+        lines.append(f'{name}{{{_labels(endpoint=endpoint)}}} {value}')
+
+
+def render_prometheus(data):
+    lines = []
+    requests = []
+    for key, histogram in sorted(data['requests'].items()):
+        endpoint, method, status = key.rsplit('|', 2)
+        requests.append(({'endpoint': endpoint, 'method': method, 'status': status}, histogram))
+    _render_histogram(
+        lines, 'albums_http_request_duration_seconds',
+        'Request latency by Flask endpoint.', LATENCY_BUCKETS, requests,
+    )
+    _render_histogram(
+        lines, 'albums_db_queries_per_request',
+        'SQL statements issued per request.', QUERY_COUNT_BUCKETS,
+        [({'endpoint': endpoint}, histogram) for endpoint, histogram in sorted(data['queries'].items())],
+    )
+    _render_counter(
+        lines, 'albums_db_queries_total', 'SQL statements issued.',
+        {endpoint: histogram['sum'] for endpoint, histogram in data['queries'].items()},
+    )
+    _render_counter(
+        lines, 'albums_db_query_seconds_total', 'Time spent executing SQL statements.',
+        data['db_seconds'],
+    )
+    _render_counter(
+        lines, 'albums_query_budget_exceeded_total',
+        'Requests that issued more SQL statements than METRICS_QUERY_BUDGET.',
+        data['over_budget'],
+    )
+    lines.append('# HELP albums_cache_events_total Cache hits, misses, sets, invalidations and errors.')
+    lines.append('# TYPE albums_cache_events_total counter')
+    for key, value in sorted(data['cache'].items()):
+        namespace, event = key.rsplit('|', 1)
+        lines.append(f'albums_cache_events_total{{{_labels(namespace=namespace, event=event)}}} {value}')
+    return '\n'.join(lines) + '\n'
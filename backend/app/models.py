@@ -47,7 +47,86 @@ class UserRating(db.Model):
     rating = db.Column(db.Integer, nullable=False) # e.g., 1-5 stars
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'album_id', name='_user_album_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'album_id', name='_user_album_uc'),
+    )
 
     def __repr__(self):
         return f'<UserRating User: {self.user_id}, Album: {self.album_id}, Rating: {self.rating}>'
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    rated_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    last_activity_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<UserStats User: {self.user_id}, Rated: {self.rated_count}>'
+
+class AlbumStats(db.Model):
+    __tablename__ = 'album_stats'
+    album_id = db.Column(db.Integer, db.ForeignKey('albums.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AlbumStats Album: {self.album_id}, Ratings: {self.rating_count}>'
+
+class UserNeighbor(db.Model):
+    # Top-K most similar listeners per user, written by compute_recommendations.py
+    __tablename__ = 'user_neighbors'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    similarity = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # Finds the lists a changed user appears in on incremental runs
+        db.Index('ix_user_neighbors_neighbor_id', 'neighbor_id'),
+    )
+
+    def __repr__(self):
+        return f'<UserNeighbor User: {self.user_id}, Neighbor: {self.neighbor_id}, {self.similarity:.3f}>'
+
+class RecommendationState(db.Model):
+    # When each user's neighbours were last computed; users whose
+    # user_stats.last_activity_at is later are recomputed on the next run
+    __tablename__ = 'recommendation_state'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<RecommendationState User: {self.user_id}, {self.computed_at}>'
+
+class SyncAction(db.Model):
+    # Idempotency keys of actions applied through POST /api/sync, with the
+    # result returned for each, so a retried batch gets the same answer
+    # without being applied twice
+    __tablename__ = 'sync_actions'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    result = db.Column(db.Text, nullable=False)  # JSON
+    client_time = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncAction User: {self.user_id}, Key: {self.key}>'
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHashingBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs werkzeug's password hashing in a small process pool.
+
+    Hashing is deliberately slow and holds the GIL, so doing it inline in a
+    gunicorn thread stalls the other thread in the same worker. Requests wait
+    on the pool instead; once PASSWORD_HASH_MAX_PENDING hashes are in flight
+    further ones are refused with a 503 rather than queued.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.workers = 1
+        self.timeout = 10
+        self.retry_after = 2
+        self._slots = threading.BoundedSemaphore(4)
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._method_prefix = 'scrypt:32768:8:1'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        # werkzeug hashes look like "scrypt:32768:8:1$salt$hash", with its
+        # defaults filled in ("scrypt" is stored as "scrypt:32768:8:1"), so
+        # take the prefix from a hash it wrote. Done here, once, so that no
+        # request pays for a hash outside the pool; with preload, gunicorn's
+        # master does it for every worker.
+        self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.retry_after = app.config['PASSWORD_HASH_RETRY_AFTER']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+        app.extensions['password_hasher'] = self
+        app.register_error_handler(PasswordHashingBusy, self._busy_response)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy(self.retry_after)
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHashingBusy(self.retry_after)
+
+    def _get_executor(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=self._mp_context()
+                    )
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    @staticmethod
+    def _mp_context():
+        # Not fork: the gunicorn worker has other threads (the rating buffer,
+        # request threads holding pool locks), and a child forked while one
+        # of them holds a lock can deadlock on it. The fork server is started
+        # once, single-threaded, and only needs werkzeug, not the app.
+        if 'forkserver' not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('spawn')
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['werkzeug.security'])
+        return context
+
+    def _busy_response(self, error):
+        return (
+            jsonify({'message': 'Server is busy, please try again shortly'}),
+            503,
+            {'Retry-After': str(error.retry_after)},
+        )
@@ -0,0 +1,310 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, text, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models import AlbumStats, UserRating, UserStats
+
+STAR_COLUMNS = [f'stars_{star}' for star in range(1, 6)]
+AGGREGATE_COLUMNS = ['rating_count', 'rating_sum'] + STAR_COLUMNS
+
+
+def dialect_insert(model):
+    # Postgres in every deployment; SQLite only for local experiments. Both
+    # support INSERT ... ON CONFLICT with the same construct.
+    if db.engine.dialect.name == 'sqlite':
+        return sqlite_insert(model)
+    return postgresql_insert(model)
+
+
+def upsert_ratings(rows):
+    """INSERT ... ON CONFLICT (user_id, album_id) DO UPDATE for one or more
+    {'user_id', 'album_id', 'rating'} dicts."""
+    stmt = dialect_insert(UserRating).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserRating.user_id, UserRating.album_id],
+        set_={'rating': stmt.excluded.rating},
+    )
+
+
+def touch_user_stats(user_id):
+    """Create the user's stats row if needed and bump last_activity_at.
+
+    This also row-locks user_stats for the user until commit, which is what
+    serializes concurrent rating writes in record_rating.
+    """
+    stmt = dialect_insert(UserStats).values(
+        user_id=user_id, last_activity_at=datetime.utcnow()
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={'last_activity_at': stmt.excluded.last_activity_at},
+        )
+    )
+
+
+def record_rating(user_id, album_id, rating):
+    """Upsert a rating and apply the change to user_stats and album_stats in
+    the current transaction. Returns the previous rating, or None if new."""
+    touch_user_stats(user_id)
+
+    previous = db.session.execute(
+        select(UserRating.rating).where(
+            UserRating.user_id == user_id, UserRating.album_id == album_id
+        )
+    ).scalar()
+    if previous == rating:
+        return previous
+
+    db.session.execute(
+        upsert_ratings({'user_id': user_id, 'album_id': album_id, 'rating': rating})
+    )
+
+    values = {
+        'rating_sum': UserStats.rating_sum + rating - (previous or 0),
+        f'stars_{rating}': getattr(UserStats, f'stars_{rating}') + 1,
+    }
+    if previous is None:
+        values['rated_count'] = UserStats.rated_count + 1
+    else:
+        values[f'stars_{previous}'] = getattr(UserStats, f'stars_{previous}') - 1
+    db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    apply_album_deltas([album_delta(album_id, previous, rating)])
+    return previous
+
+
+def import_ratings(user_id, ratings_by_album, rated_at=None):
+    """Upsert {album_id: rating} for a user with one multi-row statement and
+    bring user_stats and album_stats up to date in the same transaction.
+
+    rated_at optionally gives {album_id: datetime} to record as created_at
+    for ratings that are new, e.g. ones made offline; it's left alone for
+    ratings that already exist.
+    """
+    touch_user_stats(user_id)
+
+    previous = dict(
+        db.session.execute(
+            select(UserRating.album_id, UserRating.rating).where(
+                UserRating.user_id == user_id,
+                UserRating.album_id.in_(list(ratings_by_album)),
+            )
+        ).all()
+    )
+
+    rows = [
+        {'user_id': user_id, 'album_id': album_id, 'rating': rating}
+        for album_id, rating in ratings_by_album.items()
+    ]
+    if rated_at:
+        # A multi-row VALUES needs the same columns in every row
+        now = datetime.utcnow()
+        for row in rows:
+            row['created_at'] = rated_at.get(row['album_id']) or now
+    db.session.execute(upsert_ratings(rows))
+
+    deltas = [
+        album_delta(album_id, previous.get(album_id), rating)
+        for album_id, rating in ratings_by_album.items()
+        if previous.get(album_id) != rating
+    ]
+    if deltas:
+        apply_album_deltas(deltas)
+    backfill_user_stats(user_id)
+    # The backfill sets last_activity_at to the newest rating's created_at,
+    # which an import that only changed existing ratings doesn't move;
+    # compute_recommendations.py relies on it to notice the change
+    touch_user_stats(user_id)
+
+
+def apply_rating_batch(ratings):
+    """Write {(user_id, album_id): rating} for any number of users in one
+    transaction: one statement each for locking the users' stats rows,
+    reading the previous ratings, upserting the ratings, and updating
+    album_stats, plus one executemany for user_stats."""
+    user_ids = sorted({user_id for user_id, _ in ratings})
+    now = datetime.utcnow()
+    # Lock in a fixed order so two batches can't deadlock on each other
+    stmt = dialect_insert(UserStats).values(
+        [{'user_id': user_id, 'last_activity_at': now} for user_id in user_ids]
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={'last_activity_at': stmt.excluded.last_activity_at},
+        )
+    )
+
+    previous = {
+        (row.user_id, row.album_id): row.rating
+        for row in db.session.execute(
+            select(UserRating.user_id, UserRating.album_id, UserRating.rating).where(
+                tuple_(UserRating.user_id, UserRating.album_id).in_(list(ratings))
+            )
+        )
+    }
+    changed = {key: rating for key, rating in ratings.items() if previous.get(key) != rating}
+    if not changed:
+        return 0
+
+    db.session.execute(
+        upsert_ratings([
+            {'user_id': user_id, 'album_id': album_id, 'rating': rating}
+            for (user_id, album_id), rating in changed.items()
+        ])
+    )
+
+    # ON CONFLICT can't touch the same row twice in one statement, so the
+    # deltas are summed per album (and per user) first.
+    album_deltas = {}
+    user_deltas = {}
+    for (user_id, album_id), rating in changed.items():
+        delta = album_delta(album_id, previous.get((user_id, album_id)), rating)
+        for totals, key in ((album_deltas, album_id), (user_deltas, user_id)):
+            total = totals.setdefault(key, {column: 0 for column in AGGREGATE_COLUMNS})
+            for column in AGGREGATE_COLUMNS:
+                total[column] += delta[column]
+
+    apply_album_deltas([{'album_id': album_id, **delta} for album_id, delta in album_deltas.items()])
+    # A Core executemany; the ORM would read a list of parameter sets as a
+    # bulk update by primary key.
+    user_stats = UserStats.__table__
+    db.session.connection().execute(
+        update(user_stats)
+        .where(user_stats.c.user_id == bindparam('b_user_id'))
+        .values(
+            rated_count=user_stats.c.rated_count + bindparam('b_rating_count'),
+            **{
+                column: user_stats.c[column] + bindparam(f'b_{column}')
+                for column in AGGREGATE_COLUMNS[1:]
+            },
+        ),
+        [
+            {'b_user_id': user_id, **{f'b_{column}': value for column, value in delta.items()}}
+            for user_id, delta in user_deltas.items()
+        ],
+    )
+    return len(changed)
+
+
+def album_delta(album_id, previous, rating):
+    """The change to an album's aggregates when a user's rating goes from
+    `previous` (None for a new rating) to `rating`."""
+    delta = {column: 0 for column in AGGREGATE_COLUMNS}
+    delta['album_id'] = album_id
+    delta['rating_count'] = 0 if previous is not None else 1
+    delta['rating_sum'] = rating - (previous or 0)
+    delta[f'stars_{rating}'] += 1
+    if previous is not None:
+        delta[f'stars_{previous}'] -= 1
+    return delta
+
+
+def apply_album_deltas(deltas):
+    # Adds each delta onto the existing row, or inserts it as the first one.
+    # Rows are locked in VALUES order, so sort it: imports, buffered batches
+    # and syncs arrive in whatever order the client or queue had them, and
+    # two writers taking the same rows in opposite orders deadlock.
+    stmt = dialect_insert(AlbumStats).values(sorted(deltas, key=lambda delta: delta['album_id']))
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AlbumStats.album_id],
+            set_={
+                column: getattr(AlbumStats, column) + stmt.excluded[column]
+                for column in AGGREGATE_COLUMNS
+            },
+        )
+    )
+
+
+def rebuild_album_stats(apply=True):
+    """Recompute album_stats from user_ratings.
+
+    Returns {album_id: (stored, expected)} for every album whose stored
+    aggregates had drifted. With apply=False nothing is written.
+    """
+    if apply and db.engine.dialect.name == 'postgresql':
+        # Rating writes update album_stats last, so holding this lock while we
+        # read user_ratings means in-flight deltas land on top of our rebuild.
+        db.session.execute(text('LOCK TABLE album_stats IN EXCLUSIVE MODE'))
+
+    expected = {
+        row[0]: tuple(row[1:])
+        for row in db.session.execute(
+            select(
+                UserRating.album_id,
+                func.count(UserRating.id),
+                func.sum(UserRating.rating),
+                *[
+                    func.sum(case((UserRating.rating == star, 1), else_=0))
+                    for star in range(1, 6)
+                ],
+            ).group_by(UserRating.album_id)
+        )
+    }
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in db.session.execute(
+            select(
+                AlbumStats.album_id,
+                *[getattr(AlbumStats, column) for column in AGGREGATE_COLUMNS],
+            )
+        )
+    }
+
+    empty = (0,) * len(AGGREGATE_COLUMNS)
+    drift = {}
+    for album_id in expected.keys() | stored.keys():
+        want = expected.get(album_id, empty)
+        have = stored.get(album_id, empty)
+        if want != have:
+            drift[album_id] = (have, want)
+
+    if apply:
+        db.session.execute(delete(AlbumStats))
+        if expected:
+            db.session.execute(
+                insert(AlbumStats),
+                [
+                    dict(zip(['album_id'] + AGGREGATE_COLUMNS, (album_id,) + values))
+                    for album_id, values in expected.items()
+                ],
+            )
+    return drift
+
+
+def backfill_user_stats(user_id=None):
+    """Recompute user_stats from user_ratings, for one user or for all."""
+    stars = [
+        func.sum(case((UserRating.rating == star, 1), else_=0)) for star in range(1, 6)
+    ]
+    # The WHERE keeps SQLite from reading ON CONFLICT as a join condition
+    source = select(
+        UserRating.user_id,
+        func.count(UserRating.id),
+        func.sum(UserRating.rating),
+        *stars,
+        func.max(UserRating.created_at),
+    ).where(true()).group_by(UserRating.user_id)
+    if user_id is not None:
+        source = source.where(UserRating.user_id == user_id)
+
+    columns = ['user_id', 'rated_count', 'rating_sum'] + STAR_COLUMNS + [
+        'last_activity_at'
+    ]
+    stmt = dialect_insert(UserStats).from_select(columns, source)
+    result = db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={column: stmt.excluded[column] for column in columns[1:]},
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,98 @@
+import math
+
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from app.cache import CacheUnavailable
+
+# Reads are cheap and cached; only these count against a budget
+LIMITED_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+
+
+def parse_budget(spec):
+    """'10/60' -> (10, 60.0): a bucket of 10 requests that refills over 60
+    seconds."""
+    requests, _, seconds = spec.partition('/')
+    requests, seconds = int(requests), float(seconds or 1)
+    if requests < 1 or seconds <= 0:
+        raise ValueError(f'Invalid rate limit {spec!r}')
+    return requests, seconds
+
+
+class RateLimiter:
+    """Token-bucket limits on write requests, per blueprint (RATE_LIMITS).
+
+    Requests are counted against the user id of a valid token, or the client
+    IP without one, so login and register are limited per IP. The check runs
+    in a before_request hook and answers an empty bucket with 429 and
+    Retry-After before the view touches the database or the password hasher.
+
+    Buckets live in the app cache's backend: per worker with the local one,
+    shared between workers with the shared or Redis ones. If the backend is
+    unreachable requests are let through.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.budgets = {}
+        self.trusted_proxies = 0
+        self._cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import cache
+
+        self._cache = cache
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.budgets = {
+            blueprint: parse_budget(spec)
+            for blueprint, spec in app.config['RATE_LIMITS'].items() if spec
+        }
+        self.trusted_proxies = app.config['RATE_LIMIT_TRUSTED_PROXIES']
+        app.extensions['rate_limiter'] = self
+        if self.enabled:
+            app.before_request(self._check)
+
+    def _check(self):
+        budget = self.budgets.get(request.blueprint)
+        if budget is None or request.method not in LIMITED_METHODS:
+            return None
+
+        requests, seconds = budget
+        key = f'{self._cache.prefix}:ratelimit:{request.blueprint}:{self._client_key()}'
+        try:
+            wait = self._cache.backend.throttle(key, seconds / requests, requests)
+        except (CacheUnavailable, OSError) as e:
+            self._cache.log_error(f'Rate limit check failed, letting the request through: {e}')
+            return None
+        if wait <= 0:
+            return None
+
+        return (
+            jsonify({'message': 'Too many requests, please slow down'}),
+            429,
+            {'Retry-After': str(math.ceil(wait))},
+        )
+
+    def _client_key(self):
+        # Only verifies the token's signature; the view checks it properly
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except (JWTExtendedException, PyJWTError):
+            user_id = None
+        if user_id is not None:
+            return f'user:{user_id}'
+        return f'ip:{self._client_ip()}'
+
+    def _client_ip(self):
+        # Each trusted proxy (e.g. the Cloud Run front end) appends the
+        # address it received the request from to X-Forwarded-For
+        if self.trusted_proxies:
+            forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',')]
+            if len(forwarded) >= self.trusted_proxies and forwarded[-self.trusted_proxies]:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr
@@ -0,0 +1,135 @@
+import atexit
+import os
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class RatingBuffer:
+    """Optional write-behind for POST /api/ratings (RATING_WRITE_BEHIND).
+
+    Ratings are acknowledged as soon as they are queued. Repeated ratings of
+    the same album by the same user replace each other in the queue, so only
+    the last one is written. A background thread in each worker writes the
+    queue with apply_rating_batch() every RATING_FLUSH_INTERVAL seconds, or
+    sooner once RATING_FLUSH_SIZE ratings are waiting, and once more when
+    the worker exits.
+
+    Anything else that reads or writes a user's ratings calls flush_user()
+    first, so users always see their own ratings. That holds within one
+    worker; a read served by a different worker can be up to one interval
+    behind, and two ratings of the same album sent to different workers
+    within one interval are written in flush order.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.interval = 1.0
+        self.flush_size = 200
+        self._app = None
+        self._pending = {}
+        # Users with ratings in the batch currently being written
+        self._in_flight = frozenset()
+        self._lock = threading.Lock()
+        # Held while a batch is taken from the queue and written, so batches
+        # reach the database in the order they were queued
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+        self.stats = {'queued': 0, 'coalesced': 0, 'written': 0, 'flushes': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['RATING_WRITE_BEHIND']
+        self.interval = app.config['RATING_FLUSH_INTERVAL']
+        self.flush_size = app.config['RATING_FLUSH_SIZE']
+        self._app = app
+        app.extensions['rating_buffer'] = self
+
+    def submit(self, user_id, album_id, rating):
+        self._ensure_flusher()
+        with self._lock:
+            key = (user_id, album_id)
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[key] = rating
+            self.stats['queued'] += 1
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def flush_user(self, user_id):
+        if not self.enabled:
+            return
+        with self._lock:
+            waiting = user_id in self._in_flight or any(uid == user_id for uid, _ in self._pending)
+        if waiting:
+            self._flush(lambda key: key[0] == user_id)
+
+    def flush(self):
+        self._flush(None)
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'pending': len(self._pending)}
+
+    def _flush(self, selector):
+        with self._flush_lock:
+            with self._lock:
+                if selector is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {key: rating for key, rating in self._pending.items() if selector(key)}
+                    for key in batch:
+                        del self._pending[key]
+                self._in_flight = frozenset(user_id for user_id, _ in batch)
+            if not batch:
+                return
+
+            from app import db
+            from app.queries import apply_rating_batch
+
+            try:
+                with self._app.app_context():
+                    try:
+                        written = apply_rating_batch(batch)
+                        db.session.commit()
+                    except SQLAlchemyError as e:
+                        db.session.rollback()
+                        # Put the batch back unless a newer rating replaced it
+                        with self._lock:
+                            for key, rating in batch.items():
+                                self._pending.setdefault(key, rating)
+                            self.stats['errors'] += 1
+                        self._app.logger.warning(f'Could not write {len(batch)} buffered ratings: {e}')
+                        if selector is not None:
+                            raise
+                        return
+                with self._lock:
+                    self.stats['written'] += written
+                    self.stats['flushes'] += 1
+            finally:
+                with self._lock:
+                    self._in_flight = frozenset()
+
+    def _ensure_flusher(self):
+        # One thread per worker, started on first use after fork
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name='rating-buffer', daemon=True).start()
+            # gunicorn workers leave through sys.exit, which runs this
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._app.logger.warning(f'Rating buffer flush failed: {e}')
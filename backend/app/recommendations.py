@@ -0,0 +1,214 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import RecommendationState, UserNeighbor, UserRating, UserStats
+from app.queries import dialect_insert
+
+# Cells of the dense similarity block computed at a time (rows x users);
+# 5M float32s is 20MB
+BATCH_CELLS = 5_000_000
+
+
+def load_rating_matrix(min_ratings):
+    """All ratings as a users x albums CSR matrix of mean-centered,
+    L2-normalized rows, so that one row times another is their cosine
+    similarity. Users with fewer than min_ratings ratings get an empty row.
+
+    Returns (matrix, user_ids), where user_ids[i] is the user of row i.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    rows = db.session.execute(
+        select(UserRating.user_id, UserRating.album_id, UserRating.rating)
+    ).all()
+    if not rows:
+        return sparse.csr_matrix((0, 0)), np.array([], dtype=np.int64)
+
+    user_col, album_col, ratings = (np.array(column) for column in zip(*rows))
+    user_ids, user_index = np.unique(user_col, return_inverse=True)
+    _, album_index = np.unique(album_col, return_inverse=True)
+    ratings = ratings.astype(np.float64)
+
+    counts = np.bincount(user_index, minlength=len(user_ids))
+    means = np.bincount(user_index, weights=ratings, minlength=len(user_ids)) / counts
+    centered = ratings - means[user_index]
+    # Someone who gives everything the same rating centers to all zeros and
+    # so ends up with an empty row, same as someone below min_ratings
+    centered[counts[user_index] < min_ratings] = 0.0
+
+    norms = np.sqrt(np.bincount(user_index, weights=centered ** 2, minlength=len(user_ids)))
+    nonzero = norms[user_index] > 0
+    values = np.zeros_like(centered)
+    values[nonzero] = centered[nonzero] / norms[user_index][nonzero]
+
+    matrix = sparse.csr_matrix(
+        (values, (user_index, album_index)), shape=(len(user_ids), album_index.max() + 1)
+    )
+    matrix.eliminate_zeros()
+    return matrix, user_ids
+
+
+def similarity_batches(matrix, rows):
+    """Yield (rows, similarities) for the given row numbers, a dense block of
+    at most BATCH_CELLS at a time, with each row's similarity to itself
+    zeroed."""
+    import numpy as np
+
+    n_users = matrix.shape[0]
+    step = max(1, BATCH_CELLS // max(n_users, 1))
+    # With only 500 albums the whole matrix fits densely in memory
+    # (20MB per 10,000 users), and a dense float32 matrix product is several
+    # times faster than a sparse one that comes out dense anyway
+    columns = matrix.T.toarray().astype(np.float32)
+    for start in range(0, len(rows), step):
+        batch = rows[start:start + step]
+        block = matrix[batch].toarray().astype(np.float32) @ columns
+        block[np.arange(len(batch)), batch] = 0.0
+        yield batch, block
+
+
+def top_neighbors(block, k):
+    """Per row of a similarity block, the column numbers and similarities of
+    its k most similar users, most similar first. Only positive similarities
+    count: a listener with opposite taste isn't one to take advice from."""
+    import numpy as np
+
+    k = min(k, block.shape[1])
+    if k == 0:
+        return [([], []) for _ in range(block.shape[0])]
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    result = []
+    for row, columns in zip(block, top):
+        similarities = row[columns]
+        order = np.argsort(-similarities, kind='stable')
+        columns, similarities = columns[order], similarities[order]
+        keep = similarities > 0
+        result.append((columns[keep], similarities[keep]))
+    return result
+
+
+def compute_neighbors(k, min_ratings, full=False):
+    """Recompute user_neighbors for users whose ratings changed since their
+    last run (every user with full=True), plus the users whose neighbour
+    lists those changes can affect. Runs in the current transaction.
+
+    Returns a summary dict.
+    """
+    import numpy as np
+
+    started = datetime.utcnow()
+    matrix, user_ids = load_rating_matrix(min_ratings)
+    row_of = {int(user_id): row for row, user_id in enumerate(user_ids)}
+
+    if full:
+        changed = np.arange(len(user_ids))
+    else:
+        computed_at = dict(db.session.execute(
+            select(RecommendationState.user_id, RecommendationState.computed_at)
+        ).all())
+        last_activity = dict(db.session.execute(
+            select(UserStats.user_id, UserStats.last_activity_at)
+        ).all())
+        changed = np.array([
+            row for user_id, row in row_of.items()
+            if user_id not in computed_at
+            or (last_activity.get(user_id) and last_activity[user_id] > computed_at[user_id])
+        ], dtype=np.int64)
+
+    results = {}
+    candidates = set()
+    for batch, block in similarity_batches(matrix, changed):
+        for row, neighbors in zip(batch, top_neighbors(block, k)):
+            results[row] = neighbors
+        if not full:
+            # Similarity is symmetric, so the block also holds every other
+            # user's new similarity to the changed users
+            candidates |= _displaced(block, k, user_ids)
+
+    if not full and changed.size:
+        # Lists that hold a changed user are rebuilt too, since its
+        # similarity may have dropped and the next best isn't stored
+        for chunk in _chunks([int(user_ids[row]) for row in changed]):
+            candidates.update(db.session.execute(
+                select(UserNeighbor.user_id).where(UserNeighbor.neighbor_id.in_(chunk))
+            ).scalars())
+    affected = np.array(sorted(
+        row_of[user_id] for user_id in candidates
+        if user_id in row_of and row_of[user_id] not in results
+    ), dtype=np.int64)
+    for batch, block in similarity_batches(matrix, affected):
+        for row, neighbors in zip(batch, top_neighbors(block, k)):
+            results[row] = neighbors
+
+    written = _store(results, user_ids, started, full)
+    return {
+        'users': len(user_ids),
+        'changed': len(changed),
+        'affected': len(affected),
+        'neighbors': written,
+    }
+
+
+def _displaced(block, k, user_ids):
+    # Users some changed user is now more similar to than their current
+    # k-th neighbour, or who have room for another. Only the k-th
+    # similarity of each candidate is read, not the whole list.
+    import numpy as np
+
+    best = block.max(axis=0)
+    columns = np.nonzero(best > 0)[0]
+    candidate_ids = [int(user_ids[column]) for column in columns]
+    thresholds = {}
+    for chunk in _chunks(candidate_ids):
+        thresholds.update({
+            user_id: (count, lowest)
+            for user_id, count, lowest in db.session.execute(
+                select(UserNeighbor.user_id, func.count(), func.min(UserNeighbor.similarity))
+                .where(UserNeighbor.user_id.in_(chunk))
+                .group_by(UserNeighbor.user_id)
+            )
+        })
+
+    displaced = set()
+    for column, user_id in zip(columns, candidate_ids):
+        count, lowest = thresholds.get(user_id, (0, 0.0))
+        if count < k or best[column] > lowest:
+            displaced.add(user_id)
+    return displaced
+
+
+def _store(results, user_ids, started, full):
+    computed = [int(user_ids[row]) for row in results]
+    if full:
+        db.session.execute(delete(UserNeighbor))
+    else:
+        for chunk in _chunks(computed):
+            db.session.execute(delete(UserNeighbor).where(UserNeighbor.user_id.in_(chunk)))
+
+    rows = [
+        {'user_id': int(user_ids[row]), 'neighbor_id': int(user_ids[column]), 'similarity': float(similarity)}
+        for row, (columns, similarities) in results.items()
+        for column, similarity in zip(columns, similarities)
+    ]
+    if rows:
+        db.session.execute(insert(UserNeighbor), rows)
+
+    for chunk in _chunks(computed):
+        stmt = dialect_insert(RecommendationState).values(
+            [{'user_id': user_id, 'computed_at': started} for user_id in chunk]
+        )
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[RecommendationState.user_id],
+                set_={'computed_at': stmt.excluded.computed_at},
+            )
+        )
+    return len(rows)
+
+
+def _chunks(values, size=5000):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
@@ -1,8 +1,21 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, Response, current_app, request, jsonify, make_response, stream_with_context
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from app import db
-from app.models import User, UserProgress, Album, UserRating
+from sqlalchemy import delete, func, insert, literal, select, true, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db, cache, catalog, password_hasher, identity_cache, rating_buffer
+from app.catalog import ALBUM_FIELDS, album_summary, album_to_dict
+from app.compression import etag_matches
+from app.identity import identity_claims
+from app.passwords import PasswordHashingBusy
+from app.models import User, UserProgress, Album, UserRating, UserStats, AlbumStats, UserNeighbor, SyncAction
+from app.queries import import_ratings as import_user_ratings, record_rating, touch_user_stats
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -22,7 +35,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({'message': 'Email already exists'}), 409
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = password_hasher.hash(password)
     new_user = User(username=username, email=email, password_hash=hashed_password)
 
     db.session.add(new_user)
@@ -41,10 +54,19 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or not user.password_hash or not password_hasher.verify(user.password_hash, password):
         return jsonify({'message': 'Invalid credentials'}), 401
 
-    access_token = create_access_token(identity=str(user.id))
+    # Upgrade hashes made with older PASSWORD_HASH_METHOD settings. If the
+    # pool is busy the user is still logged in and we try again next time.
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+        except PasswordHashingBusy:
+            pass
+
+    access_token = create_access_token(identity=str(user.id), additional_claims=identity_claims(user))
     return jsonify({
         'message': 'Login successful',
         'user_id': user.id,
@@ -62,51 +84,63 @@ def logout():
 @jwt_required()
 def get_current_user():
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    # Usually answered from the token's own claims, without touching the DB
+    identity = identity_cache.get(user_id)
     
-    if not user:
+    if not identity:
         return jsonify({'message': 'User not found'}), 404
     
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email
-    }), 200
+    return jsonify(identity), 200
 
 progress_bp = Blueprint('progress', __name__)
 
+# Most albums a client can ask for ahead of its current one
+MAX_LOOKAHEAD = 50
+
+def _progress_payload(current_album, rated_count, lookahead=0):
+    # Shared by GET /api/progress and POST /api/sync. With a lookahead the
+    # next albums come along, so a client can keep going offline.
+    if current_album.rank == 1 and (rated_count or 0) >= 500:
+        return {
+            'all_completed': True,
+            'message': 'All albums completed!'
+        }
+
+    payload = {
+        'all_completed': False,
+        'current_album': catalog.encoded(current_album)
+    }
+    if lookahead:
+        payload['upcoming'] = [catalog.encoded(album) for album in catalog.upcoming(current_album, lookahead)]
+    return payload
+
 @progress_bp.route('', methods=['GET'])
 @jwt_required()
 def get_progress():
+    # Optional: lookahead=N (up to MAX_LOOKAHEAD) also returns the N albums
+    # after the current one as "upcoming"
     user_id = int(get_jwt_identity())
-    
-    user_progress = UserProgress.query.filter_by(user_id=user_id).first()
+    rating_buffer.flush_user(user_id)
+
+    try:
+        lookahead = _int_arg('lookahead', 0)
+    except ValueError:
+        return jsonify({'message': 'lookahead must be an integer'}), 400
+    if lookahead < 0 or lookahead > MAX_LOOKAHEAD:
+        return jsonify({'message': f'lookahead must be between 0 and {MAX_LOOKAHEAD}'}), 400
+    
+    user_progress = db.session.execute(
+        select(UserProgress.current_album_id, UserStats.rated_count)
+        .outerjoin(UserStats, UserStats.user_id == UserProgress.user_id)
+        .where(UserProgress.user_id == user_id)
+    ).first()
     
     if not user_progress:
         return jsonify({'message': 'No progress found', 'needs_onboarding': True}), 404
     
-    if user_progress and user_progress.album:
-        # Check if user has completed all albums
-        if user_progress.album.rank == 1:
-            # Check if they've actually marked it as complete
-            completed_albums = UserRating.query.filter_by(user_id=user_id).count()
-            if completed_albums >= 500:
-                return jsonify({
-                    'all_completed': True,
-                    'message': 'All albums completed!'
-                }), 200
-        
-        return jsonify({
-            'all_completed': False,
-            'current_album': {
-                'id': user_progress.album.id,
-                'rank': user_progress.album.rank,
-                'artist': user_progress.album.artist,
-                'album': user_progress.album.album,
-                'info': user_progress.album.info,
-                'description': user_progress.album.description
-            }
-        }), 200
+    current_album = catalog.get(user_progress.current_album_id)
+    if current_album:
+        return jsonify(_progress_payload(current_album, user_progress.rated_count, lookahead)), 200
     
     return jsonify({'message': 'No album data found'}), 404
 
@@ -128,7 +162,7 @@ def initialize_progress():
         return jsonify({'message': 'Invalid album rank. Must be between 1 and 500'}), 400
     
     # Find the album by rank
-    album = Album.query.filter_by(rank=album_rank).first()
+    album = catalog.get_by_rank(album_rank)
     if not album:
         return jsonify({'message': f'Album with rank {album_rank} not found'}), 404
     
@@ -139,14 +173,7 @@ def initialize_progress():
     
     return jsonify({
         'message': 'Progress initialized successfully',
-        'current_album': {
-            'id': album.id,
-            'rank': album.rank,
-            'artist': album.artist,
-            'album': album.album,
-            'info': album.info,
-            'description': album.description
-        }
+        'current_album': catalog.encoded(album)
     }), 201
 
 @progress_bp.route('/complete', methods=['POST'])
@@ -159,7 +186,7 @@ def complete_album():
     if not user_progress:
         return jsonify({'message': 'No progress found for user'}), 404
     
-    current_album = user_progress.album
+    current_album = catalog.get(user_progress.current_album_id)
     if not current_album:
         return jsonify({'message': 'No current album found'}), 404
     
@@ -169,25 +196,86 @@ def complete_album():
             'all_completed': True
         }), 200
     
-    next_album = Album.query.filter_by(rank=current_album.rank - 1).first()
+    next_album = catalog.next_album(current_album)
     
     if not next_album:
         return jsonify({'message': 'Next album not found'}), 404
     
     user_progress.current_album_id = next_album.id
+    touch_user_stats(user_id)
     db.session.commit()
     
     return jsonify({
         'message': 'Album completed successfully',
         'all_completed': False,
-        'next_album': {
-            'id': next_album.id,
-            'rank': next_album.rank,
-            'artist': next_album.artist,
-            'album': next_album.album,
-            'info': next_album.info,
-            'description': next_album.description
-        }
+        'next_album': catalog.encoded(next_album)
+    }), 200
+
+@progress_bp.route('/complete-and-rate', methods=['POST'])
+@jwt_required()
+def complete_and_rate():
+    # Rates the current album (optional) and advances to the next one in a
+    # single transaction: a conditional UPDATE ... RETURNING on
+    # user_progress, then the rating upsert and user_stats delta.
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+    data = request.get_json()
+
+    album_id = data.get('album_id')
+    rating = data.get('rating')
+
+    if not album_id:
+        return jsonify({'message': 'Missing album_id'}), 400
+
+    if rating is not None and not _valid_rating(rating):
+        return jsonify({'message': 'Rating must be an integer between 1 and 5'}), 400
+
+    album = catalog.get(album_id)
+    if not album:
+        return jsonify({'message': 'Album not found'}), 404
+
+    # Album #1 has no successor; the pointer stays put and the journey is done
+    next_album = catalog.next_album(album) or album
+
+    # Only advance if the client is completing the album it is actually on.
+    # A double-click (or a second tab) finds the pointer already moved and
+    # updates nothing, instead of skipping an album.
+    advanced = db.session.execute(
+        update(UserProgress)
+        .where(UserProgress.user_id == user_id, UserProgress.current_album_id == album.id)
+        .values(current_album_id=next_album.id)
+        .returning(UserProgress.current_album_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if not advanced:
+        db.session.rollback()
+        user_progress = UserProgress.query.filter_by(user_id=user_id).first()
+        if not user_progress:
+            return jsonify({'message': 'No progress found for user', 'needs_onboarding': True}), 404
+        current_album = catalog.get(user_progress.current_album_id)
+        return jsonify({
+            'message': 'Album is not the current album',
+            'current_album': catalog.encoded(current_album) if current_album else None
+        }), 409
+
+    if rating is not None:
+        record_rating(user_id, album.id, rating)
+    else:
+        touch_user_stats(user_id)
+
+    db.session.commit()
+
+    if next_album.id == album.id:
+        return jsonify({
+            'message': 'Congratulations! You\'ve completed all 500 albums!',
+            'all_completed': True
+        }), 200
+
+    return jsonify({
+        'message': 'Album completed successfully',
+        'all_completed': False,
+        'next_album': catalog.encoded(next_album)
     }), 200
 
 albums_bp = Blueprint('albums', __name__)
@@ -195,18 +283,205 @@ albums_bp = Blueprint('albums', __name__)
 @albums_bp.route('', methods=['GET'])
 @jwt_required()
 def get_albums():
-    albums = Album.query.order_by(Album.rank.desc()).all()
-    
-    albums_data = [{
-        'id': album.id,
-        'rank': album.rank,
-        'artist': album.artist,
-        'album': album.album,
-        'info': album.info,
-        'description': album.description
-    } for album in albums]
-    
-    return jsonify({'albums': albums_data}), 200
+    # Optional query parameters:
+    #   fields=rank,artist,album   only return these album fields
+    #   min_rank / max_rank        inclusive rank range
+    #   limit / cursor             page through the countdown; pass back the
+    #                              returned next_cursor to get the next page
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        min_rank = _int_arg('min_rank', 1)
+        max_rank = _int_arg('max_rank', 500)
+        cursor = _int_arg('cursor')
+        limit = _int_arg('limit')
+    except ValueError:
+        return jsonify({'message': 'min_rank, max_rank, cursor and limit must be integers'}), 400
+
+    if limit is not None and (limit < 1 or limit > 500):
+        return jsonify({'message': 'limit must be between 1 and 500'}), 400
+
+    # The ETag covers both the catalog contents and the shape of the response,
+    # so clients can revalidate without us serializing anything.
+    snapshot = catalog.snapshot
+    etag = albums_etag(snapshot, fields, min_rank, max_rank, cursor, limit)
+    matched = etag_matches(etag)
+    if matched:
+        response = make_response('', 304)
+        response.set_etag(matched)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    response = jsonify(albums_page(snapshot, fields, min_rank, max_rank, cursor, limit))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response, 200
+
+
+def albums_etag(snapshot, fields=None, min_rank=1, max_rank=500, cursor=None, limit=None):
+    return hashlib.sha1(
+        f'{snapshot.etag}|{fields}|{min_rank}|{max_rank}|{cursor}|{limit}'.encode('utf-8')
+    ).hexdigest()
+
+
+def albums_page(snapshot, fields=None, min_rank=1, max_rank=500, cursor=None, limit=None):
+    """The GET /api/albums body; the defaults are the full catalog."""
+    # Albums are in countdown order (highest rank first); the cursor is the
+    # rank of the last album on the previous page.
+    upper = max_rank if cursor is None else min(max_rank, cursor - 1)
+    albums = [album for album in snapshot.albums if min_rank <= album.rank <= upper]
+
+    next_cursor = None
+    if limit is not None and len(albums) > limit:
+        albums = albums[:limit]
+        next_cursor = albums[-1].rank
+
+    if fields:
+        albums_data = [_album_fields(album, fields) for album in albums]
+    else:
+        albums_data = [catalog.encoded(album) for album in albums]
+    return {'albums': albums_data, 'next_cursor': next_cursor}
+
+
+@albums_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_albums():
+    # Autocomplete over artist, title, label/year and description, answered
+    # from the catalog's in-memory index:
+    #   q=pink fl          every word must match; the last one as a prefix
+    #   limit=10           1-50 results, best first
+    #   fields=id,rank     as for GET /api/albums
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'Missing search query (q)'}), 400
+
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        limit = _int_arg('limit', 10)
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+
+    if limit < 1 or limit > 50:
+        return jsonify({'message': 'limit must be between 1 and 50'}), 400
+
+    results = catalog.search(query, limit)
+    return jsonify({
+        'query': query,
+        'results': [{**_album_fields(album, fields), 'score': score} for album, score in results]
+    }), 200
+
+
+def _fields_arg():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in ALBUM_FIELDS]
+    if unknown:
+        raise ValueError(
+            f'Unknown fields: {", ".join(unknown)}. '
+            f'Allowed: {", ".join(sorted(ALBUM_FIELDS))}'
+        )
+    return fields
+
+
+def _album_fields(album, fields):
+    if fields:
+        return {field: getattr(album, field) for field in fields}
+    return album_to_dict(album)
+
+
+# Community aggregates change slowly and are the same for everyone, so
+# they're served from a short-lived cache (shared between workers unless
+# CACHE_BACKEND is local). rebuild_album_stats.py invalidates it.
+community_cache = cache.namespace('community')
+
+def _album_stats_dict(stats):
+    return {
+        'rating_count': stats.rating_count,
+        'average_rating': stats.rating_sum / stats.rating_count if stats.rating_count else None,
+        'histogram': {str(star): getattr(stats, f'stars_{star}') for star in range(1, 6)}
+    }
+
+@albums_bp.route('/<int:album_id>/stats', methods=['GET'])
+@jwt_required()
+def get_album_stats(album_id):
+    if not catalog.get(album_id):
+        return jsonify({'message': 'Album not found'}), 404
+
+    key = ('album', album_id)
+    data = community_cache.get(key)
+    if data is None:
+        stats = db.session.get(AlbumStats, album_id)
+        if stats:
+            data = _album_stats_dict(stats)
+        else:
+            data = {
+                'rating_count': 0,
+                'average_rating': None,
+                'histogram': {str(star): 0 for star in range(1, 6)}
+            }
+        data['album_id'] = album_id
+        community_cache.set(key, data, current_app.config['COMMUNITY_STATS_TTL'])
+
+    return jsonify(data), 200
+
+@albums_bp.route('/top-rated', methods=['GET'])
+@jwt_required()
+def get_top_rated():
+    try:
+        limit = _int_arg('limit', 20)
+        min_ratings = _int_arg('min_ratings', 3)
+    except ValueError:
+        return jsonify({'message': 'limit and min_ratings must be integers'}), 400
+
+    if limit < 1 or limit > 100 or min_ratings < 1:
+        return jsonify({'message': 'limit must be between 1 and 100 and min_ratings positive'}), 400
+
+    key = ('top', limit, min_ratings)
+    data = community_cache.get(key)
+    if data is None:
+        average = AlbumStats.rating_sum * 1.0 / AlbumStats.rating_count
+        rows = db.session.execute(
+            select(AlbumStats)
+            .where(AlbumStats.rating_count >= min_ratings)
+            .order_by(average.desc(), AlbumStats.rating_count.desc(), AlbumStats.album_id)
+            .limit(limit)
+        ).scalars().all()
+
+        albums_data = []
+        for stats in rows:
+            album = catalog.get(stats.album_id)
+            albums_data.append({
+                # A plain dict: this goes into the cache, which stores JSON
+                'album': album_summary(album),
+                **_album_stats_dict(stats)
+            })
+        data = {'albums': albums_data}
+        community_cache.set(key, data, current_app.config['COMMUNITY_STATS_TTL'])
+
+    return jsonify(data), 200
+
+
+def _valid_rating(rating):
+    # bool is an int subclass, but true isn't a rating (and there's no
+    # stars_True column to count it in)
+    return isinstance(rating, int) and not isinstance(rating, bool) and 1 <= rating <= 5
+
+def _int_arg(name, default=None):
+    # request.args.get(type=int) silently falls back to the default on bad
+    # input; we want a 400 instead.
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    return int(value)
 
 ratings_bp = Blueprint('ratings', __name__)
 
@@ -222,21 +497,19 @@ def submit_rating():
     if not album_id or rating is None:
         return jsonify({'message': 'Missing album_id or rating'}), 400
     
-    if not isinstance(rating, int) or rating < 1 or rating > 5:
+    if not _valid_rating(rating):
         return jsonify({'message': 'Rating must be an integer between 1 and 5'}), 400
     
-    album = Album.query.get(album_id)
+    album = catalog.get(album_id)
     if not album:
         return jsonify({'message': 'Album not found'}), 404
+
+    if rating_buffer.enabled:
+        # Written by the buffer's next flush; rapid re-ratings collapse into one
+        rating_buffer.submit(user_id, album.id, rating)
+        return jsonify({'message': 'Rating accepted', 'pending': True}), 202
     
-    existing_rating = UserRating.query.filter_by(user_id=user_id, album_id=album_id).first()
-    
-    if existing_rating:
-        existing_rating.rating = rating
-    else:
-        new_rating = UserRating(user_id=user_id, album_id=album_id, rating=rating)
-        db.session.add(new_rating)
-    
+    record_rating(user_id, album.id, rating)
     db.session.commit()
     
     return jsonify({'message': 'Rating submitted successfully'}), 200
@@ -245,20 +518,502 @@ def submit_rating():
 @jwt_required()
 def get_ratings():
     user_id = int(get_jwt_identity())
-    
-    ratings = UserRating.query.filter_by(user_id=user_id).join(Album).order_by(Album.rank.desc()).all()
-    
+    rating_buffer.flush_user(user_id)
+
+    # Optional keyset pagination: limit=N, then cursor=<next_cursor> from the
+    # previous page. The cursor is the (rank, rating id) of the last row seen.
+    try:
+        limit = _int_arg('limit')
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_rank, cursor_id = (int(part) for part in cursor.split(':'))
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer and cursor of the form rank:id'}), 400
+
+    if limit is not None and (limit < 1 or limit > 500):
+        return jsonify({'message': 'limit must be between 1 and 500'}), 400
+
+    # Select plain columns from the join rather than ORM objects, so
+    # serializing a row never lazy-loads rating.album.
+    query = (
+        select(
+            UserRating.id, UserRating.album_id, UserRating.rating, UserRating.created_at,
+            Album.rank, Album.artist, Album.album
+        )
+        .join(Album, Album.id == UserRating.album_id)
+        .where(UserRating.user_id == user_id)
+        .order_by(Album.rank.desc(), UserRating.id.desc())
+    )
+    if cursor:
+        query = query.where(tuple_(Album.rank, UserRating.id) < (cursor_rank, cursor_id))
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    rows = db.session.execute(query).all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1].rank}:{rows[-1].id}'
+
     ratings_data = [{
-        'id': rating.id,
-        'album_id': rating.album_id,
-        'rating': rating.rating,
-        'created_at': rating.created_at.isoformat(),
+        'id': row.id,
+        'album_id': row.album_id,
+        'rating': row.rating,
+        'created_at': row.created_at.isoformat(),
         'album': {
-            'id': rating.album.id,
-            'rank': rating.album.rank,
-            'artist': rating.album.artist,
-            'album': rating.album.album
+            'id': row.album_id,
+            'rank': row.rank,
+            'artist': row.artist,
+            'album': row.album
         }
-    } for rating in ratings]
-    
-    return jsonify({'ratings': ratings_data}), 200
+    } for row in rows]
+
+    return jsonify({'ratings': ratings_data, 'next_cursor': next_cursor}), 200
+
+@ratings_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_ratings():
+    # Body: {"ratings": [{"rank": 500, "rating": 4}, {"album_id": 12, "rating": 5}, ...]}
+    # Either rank or album_id identifies the album. The whole batch is
+    # validated first and then written with one multi-row upsert.
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+    data = request.get_json()
+
+    items = data.get('ratings') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'ratings must be a non-empty list'}), 400
+    if len(items) > 500:
+        return jsonify({'message': 'Cannot import more than 500 ratings at once'}), 400
+
+    errors = []
+    ratings_by_album = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'message': 'Each rating must be an object'})
+            continue
+
+        if item.get('album_id') is not None:
+            key, lookup = item['album_id'], catalog.get
+        elif item.get('rank') is not None:
+            key, lookup = item['rank'], catalog.get_by_rank
+        else:
+            errors.append({'index': index, 'message': 'Missing album_id or rank'})
+            continue
+        if isinstance(key, bool) or not isinstance(key, int):
+            errors.append({'index': index, 'message': 'album_id and rank must be integers'})
+            continue
+        album = lookup(key)
+        if not album:
+            errors.append({'index': index, 'message': 'Album not found'})
+            continue
+
+        rating = item.get('rating')
+        if not _valid_rating(rating):
+            errors.append({'index': index, 'message': 'Rating must be an integer between 1 and 5'})
+            continue
+
+        # Later entries for the same album win, as they would one at a time
+        ratings_by_album[album.id] = rating
+
+    if errors:
+        return jsonify({'message': 'Import rejected; nothing was saved', 'errors': errors}), 400
+
+    import_user_ratings(user_id, ratings_by_album)
+    db.session.commit()
+
+    return jsonify({'message': 'Ratings imported successfully', 'imported': len(ratings_by_album)}), 200
+
+@ratings_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_ratings():
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+
+    # Rows are pulled through a server-side cursor in batches and written out
+    # as they arrive, so the export never holds the whole list in memory.
+    query = (
+        select(Album.rank, Album.artist, Album.album, UserRating.rating, UserRating.created_at)
+        .join(Album, Album.id == UserRating.album_id)
+        .where(UserRating.user_id == user_id)
+        .order_by(Album.rank.desc())
+        .execution_options(stream_results=True, yield_per=100)
+    )
+
+    def generate_ndjson():
+        for row in db.session.execute(query):
+            yield json.dumps({
+                'rank': row.rank,
+                'artist': row.artist,
+                'album': row.album,
+                'rating': row.rating,
+                'created_at': row.created_at.isoformat()
+            }) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Rank', 'Artist', 'Album', 'Rating', 'Rated At'])
+        for row in db.session.execute(query):
+            writer.writerow([row.rank, row.artist, row.album, row.rating, row.created_at.isoformat()])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        generator, mimetype = generate_csv, 'text/csv'
+    else:
+        generator, mimetype = generate_ndjson, 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(generator()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=ratings.{export_format}'}
+    )
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+DASHBOARD_SORTS = {
+    'date': lambda cols: (cols.created_at.desc(), cols.id.desc()),
+    'rating': lambda cols: (cols.rating.desc(), cols.id.desc()),
+    'rank': lambda cols: (cols.rank.asc(), cols.id.asc()),
+}
+
+@dashboard_bp.route('', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+
+    sort = request.args.get('sort', 'date')
+    if sort not in DASHBOARD_SORTS:
+        return jsonify({'message': f'sort must be one of: {", ".join(DASHBOARD_SORTS)}'}), 400
+
+    try:
+        rating_filter = _int_arg('rating')
+        page_number = _int_arg('page', 1)
+        per_page = _int_arg('per_page', 50)
+    except ValueError:
+        return jsonify({'message': 'rating, page and per_page must be integers'}), 400
+
+    if rating_filter is not None and (rating_filter < 1 or rating_filter > 5):
+        return jsonify({'message': 'Rating filter must be between 1 and 5'}), 400
+    if page_number < 1 or per_page < 1 or per_page > 500:
+        return jsonify({'message': 'page must be positive and per_page between 1 and 500'}), 400
+
+    # Everything below comes back from a single statement: a one-row
+    # subquery for the user, their user_stats row and progress pointer
+    # outer-joined onto it, and the requested page of ratings outer-joined
+    # after that so that a user with no ratings still gets a row.
+    me = select(literal(user_id).label('user_id')).subquery()
+    counts = [
+        func.coalesce(UserStats.rated_count, 0).label('rated'),
+        func.coalesce(UserStats.rating_sum, 0).label('rating_sum'),
+        *[
+            func.coalesce(getattr(UserStats, f'stars_{star}'), 0).label(f'stars_{star}')
+            for star in range(1, 6)
+        ]
+    ]
+
+    page_query = (
+        select(UserRating.id, UserRating.album_id, UserRating.rating, UserRating.created_at, Album.rank)
+        .join(Album, Album.id == UserRating.album_id)
+        .where(UserRating.user_id == user_id)
+    )
+    if rating_filter is not None:
+        page_query = page_query.where(UserRating.rating == rating_filter)
+    page_order = DASHBOARD_SORTS[sort](page_query.selected_columns)
+    page = page_query.order_by(*page_order).limit(per_page).offset((page_number - 1) * per_page).subquery()
+
+    rows = db.session.execute(
+        select(UserProgress.current_album_id, *counts, page)
+        .select_from(me)
+        .outerjoin(UserProgress, UserProgress.user_id == me.c.user_id)
+        .outerjoin(UserStats, UserStats.user_id == me.c.user_id)
+        .outerjoin(page, true())
+        .order_by(*DASHBOARD_SORTS[sort](page.c))
+    ).all()
+
+    first = rows[0]
+    histogram = {str(star): first._mapping[f'stars_{star}'] for star in range(1, 6)}
+    rated = first.rated
+
+    ratings_data = []
+    for row in rows:
+        if row.id is None:
+            continue
+        album = catalog.get(row.album_id)
+        ratings_data.append({
+            'id': row.id,
+            'album_id': row.album_id,
+            'rating': row.rating,
+            'created_at': row.created_at.isoformat(),
+            'album': catalog.encoded(album, summary=True)
+        })
+
+    current_album = catalog.get(first.current_album_id) if first.current_album_id else None
+    if current_album is None:
+        progress = None
+        completed = 0
+    elif current_album.rank == 1 and rated >= 500:
+        progress = {'all_completed': True}
+        completed = 500
+    else:
+        progress = {'all_completed': False, 'current_album': catalog.encoded(current_album)}
+        completed = 500 - current_album.rank
+
+    total = histogram[str(rating_filter)] if rating_filter is not None else rated
+
+    return jsonify({
+        'needs_onboarding': first.current_album_id is None,
+        'progress': progress,
+        'stats': {
+            'completed': completed,
+            'remaining': 500 - completed,
+            'percentage': completed / 500 * 100,
+            'rated': rated,
+            'average_rating': first.rating_sum / rated if rated else 0,
+            'histogram': histogram
+        },
+        'ratings': ratings_data,
+        'pagination': {
+            'page': page_number,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+    }), 200
+
+recommendations_bp = Blueprint('recommendations', __name__)
+
+# Neighbours who must have rated an album before it's recommended
+RECOMMENDATION_MIN_SUPPORT = 2
+
+@recommendations_bp.route('', methods=['GET'])
+@jwt_required()
+def get_recommendations():
+    # Albums rated highly by the user's nearest listeners, from the
+    # user_neighbors lists compute_recommendations.py keeps up to date.
+    # The prediction is the user's own average plus the neighbours'
+    # similarity-weighted deviation from theirs.
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+
+    try:
+        limit = _int_arg('limit', 10)
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+
+    if limit < 1 or limit > 50:
+        return jsonify({'message': 'limit must be between 1 and 50'}), 400
+
+    own = aliased(UserRating)
+    my_average = (
+        select(UserStats.rating_sum * 1.0 / UserStats.rated_count)
+        .where(UserStats.user_id == user_id, UserStats.rated_count > 0)
+        .scalar_subquery()
+    )
+    deviation = func.sum(
+        UserNeighbor.similarity
+        * (UserRating.rating - UserStats.rating_sum * 1.0 / UserStats.rated_count)
+    ) / func.sum(UserNeighbor.similarity)
+    support = func.count()
+
+    rows = db.session.execute(
+        select(UserRating.album_id, deviation.label('deviation'), support.label('support'),
+               func.coalesce(my_average, 3.0).label('average'))
+        .join(UserNeighbor, UserNeighbor.neighbor_id == UserRating.user_id)
+        .join(UserStats, UserStats.user_id == UserRating.user_id)
+        .where(UserNeighbor.user_id == user_id)
+        .where(~select(own.id).where(own.user_id == user_id, own.album_id == UserRating.album_id).exists())
+        .group_by(UserRating.album_id)
+        .having(support >= RECOMMENDATION_MIN_SUPPORT)
+        .order_by(deviation.desc(), support.desc(), UserRating.album_id)
+        .limit(limit)
+    ).all()
+
+    recommendations = []
+    for row in rows:
+        album = catalog.get(row.album_id)
+        if album is None:
+            continue
+        recommendations.append({
+            'album': catalog.encoded(album, summary=True),
+            'predicted_rating': round(min(5.0, max(1.0, row.average + row.deviation)), 2),
+            'neighbors': row.support
+        })
+
+    if not recommendations:
+        return jsonify({
+            'recommendations': [],
+            'message': 'No recommendations yet. Rate a few more albums and check back later.'
+        }), 200
+    return jsonify({'recommendations': recommendations}), 200
+
+sync_bp = Blueprint('sync', __name__)
+
+SYNC_ACTION_TYPES = ('complete', 'rate')
+
+def _client_time(value, now):
+    # ISO 8601 from the client, stored like every other timestamp as naive
+    # UTC. A clock running ahead can't date anything in the future.
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(parsed, now)
+
+@sync_bp.route('', methods=['POST'])
+@jwt_required()
+def sync_actions():
+    # Body: {"actions": [{"id": "<idempotency key>", "type": "complete" | "rate",
+    #                     "album_id": 12, "rating": 4, "client_time": "<ISO 8601>"}, ...],
+    #        "lookahead": 10}
+    # Actions queued offline are applied in order, all in one transaction,
+    # against the user's progress as it is now rather than as the client
+    # last saw it: completing an album the pointer has already passed (say,
+    # on another device) keeps its rating but doesn't move the pointer back.
+    # Each action gets a result; one whose id was seen before gets the
+    # stored result again instead of being applied twice.
+    user_id = int(get_jwt_identity())
+    rating_buffer.flush_user(user_id)
+    data = request.get_json()
+
+    actions = data.get('actions') if isinstance(data, dict) else None
+    if not isinstance(actions, list):
+        return jsonify({'message': 'actions must be a list'}), 400
+    max_actions = current_app.config['SYNC_MAX_ACTIONS']
+    if len(actions) > max_actions:
+        return jsonify({'message': f'Cannot sync more than {max_actions} actions at once'}), 400
+    for index, action in enumerate(actions):
+        key = action.get('id') if isinstance(action, dict) else None
+        if not isinstance(key, str) or not 1 <= len(key) <= 64:
+            return jsonify({'message': f'Action {index} needs an id of 1 to 64 characters'}), 400
+
+    lookahead = data.get('lookahead', 0)
+    if not isinstance(lookahead, int) or lookahead < 0 or lookahead > MAX_LOOKAHEAD:
+        return jsonify({'message': f'lookahead must be between 0 and {MAX_LOOKAHEAD}'}), 400
+
+    now = datetime.utcnow()
+    db.session.execute(
+        delete(SyncAction).where(
+            SyncAction.user_id == user_id,
+            SyncAction.created_at < now - timedelta(days=current_app.config['SYNC_KEY_RETENTION_DAYS']),
+        )
+    )
+
+    # Locked until commit, so two batches for the same user (two tabs
+    # coming back online) are applied one after the other
+    user_progress = db.session.execute(
+        select(UserProgress).where(UserProgress.user_id == user_id).with_for_update()
+    ).scalar()
+    current_album = catalog.get(user_progress.current_album_id) if user_progress else None
+
+    seen = {}
+    keys = list({action['id'] for action in actions})
+    if keys:
+        seen = {
+            key: json.loads(result)
+            for key, result in db.session.execute(
+                select(SyncAction.key, SyncAction.result).where(
+                    SyncAction.user_id == user_id, SyncAction.key.in_(keys)
+                )
+            )
+        }
+
+    results = []
+    applied = []
+    ratings_by_album = {}
+    rated_at = {}
+    start_album = current_album
+    for action in actions:
+        key = action['id']
+        if key in seen:
+            results.append({**seen[key], 'replayed': True})
+            continue
+
+        album_id = action.get('album_id')
+        album = catalog.get(album_id) if isinstance(album_id, int) else None
+        result = {'id': key, 'type': action.get('type'), 'album_id': album.id if album else None}
+        rating = action.get('rating')
+        try:
+            client_time = _client_time(action.get('client_time'), now)
+        except (TypeError, ValueError, AttributeError):
+            client_time = None
+            result.update(status='rejected', message='client_time must be an ISO 8601 timestamp')
+        else:
+            if action.get('type') not in SYNC_ACTION_TYPES:
+                result.update(status='rejected', message='type must be complete or rate')
+            elif not album:
+                result.update(status='rejected', message='Album not found')
+            elif (rating is not None or action['type'] == 'rate') and not _valid_rating(rating):
+                result.update(status='rejected', message='Rating must be an integer between 1 and 5')
+            elif action['type'] == 'complete' and current_album is None:
+                result.update(status='rejected', message='No progress found for user')
+            elif action['type'] == 'complete' and album.rank > current_album.rank:
+                result['status'] = 'already_completed'
+            elif action['type'] == 'complete' and current_album.rank - album.rank > MAX_LOOKAHEAD:
+                # Further than any lookahead reaches, so not an album the
+                # client could have got to from here
+                result.update(status='rejected', message='Album is too far ahead of the current album')
+            elif action['type'] == 'complete':
+                # The album the user is on, or one further along that the
+                # client reached from its lookahead (a completion of an
+                # album before it is still queued, or was made elsewhere);
+                # either way the pointer moves past it. Album #1 has no
+                # successor and stays put.
+                current_album = catalog.next_album(album) or album
+                result['status'] = 'completed'
+            else:
+                result['status'] = 'rated'
+
+        if result['status'] != 'rejected' and rating is not None:
+            # Later ratings of the same album win, as they would one at a
+            # time; a new rating is dated by when it was first made
+            ratings_by_album[album.id] = rating
+            if client_time:
+                rated_at.setdefault(album.id, client_time)
+
+        seen[key] = result
+        results.append(result)
+        applied.append({
+            'user_id': user_id,
+            'key': key,
+            'result': json.dumps(result),
+            'client_time': client_time,
+            'created_at': now,
+        })
+
+    if current_album is not start_album:
+        user_progress.current_album_id = current_album.id
+    if ratings_by_album:
+        import_user_ratings(user_id, ratings_by_album, rated_at)
+    elif current_album is not start_album:
+        touch_user_stats(user_id)
+    try:
+        if applied:
+            db.session.execute(insert(SyncAction), applied)
+        db.session.commit()
+    except IntegrityError:
+        # The same key arrived in a concurrent batch that committed first;
+        # retrying the batch replays it
+        db.session.rollback()
+        return jsonify({'message': 'Sync conflicted with another request, please retry'}), 409
+
+    if current_album is None:
+        progress = {'needs_onboarding': True}
+    else:
+        # The count only matters on album #1
+        rated_count = current_album.rank == 1 and db.session.execute(
+            select(UserStats.rated_count).where(UserStats.user_id == user_id)
+        ).scalar()
+        progress = _progress_payload(current_album, rated_count, lookahead)
+
+    return jsonify({'results': results, 'progress': progress}), 200
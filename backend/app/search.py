@@ -0,0 +1,115 @@
+import bisect
+import re
+import unicodedata
+
+# Field weights: a hit in the artist or title matters far more than the same
+# word somewhere in the description.
+FIELD_WEIGHTS = (('artist', 4.0), ('album', 4.0), ('info', 1.0), ('description', 0.5))
+# Fields whose words can be matched by prefix as the user types. Description
+# words only match whole, or a two-letter prefix would match half the catalog.
+PREFIX_FIELDS = frozenset(('artist', 'album', 'info'))
+PREFIX_FACTOR = 0.6
+RANK_MATCH_SCORE = 20.0
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r'[\W_]+')
+# The combining diacritic blocks NFKD splits accented letters into
+_COMBINING_MARKS = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+
+
+def fold(text):
+    """Lowercase, strip accents and punctuation: "Beyoncé's" -> "beyonces"."""
+    if not text:
+        return ''
+    if not text.isascii():
+        text = _COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', text))
+    return _NON_WORD.sub(' ', _APOSTROPHES.sub('', text.casefold())).strip()
+
+
+def tokenize(text):
+    return fold(text).split()
+
+
+class SearchIndex:
+    """Inverted index over one catalog snapshot.
+
+    Each CatalogSnapshot builds one from its albums; searching never
+    touches the database.
+    """
+
+    def __init__(self, albums):
+        self.albums = tuple(albums)
+        self.by_rank = {album.rank: position for position, album in enumerate(self.albums)}
+        # word -> {album position: weight}, for whole-word matches
+        self.postings = {}
+        # word -> {album position: weight}, restricted to PREFIX_FIELDS
+        prefix_postings = {}
+        self.folded_titles = []
+
+        for position, album in enumerate(self.albums):
+            for field, weight in FIELD_WEIGHTS:
+                for word in set(tokenize(getattr(album, field))):
+                    entry = self.postings.setdefault(word, {})
+                    entry[position] = entry.get(position, 0.0) + weight
+                    if field in PREFIX_FIELDS:
+                        entry = prefix_postings.setdefault(word, {})
+                        entry[position] = entry.get(position, 0.0) + weight
+            self.folded_titles.append((fold(album.artist), fold(album.album)))
+
+        self.prefix_words = sorted(prefix_postings)
+        self.prefix_postings = prefix_postings
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (album, score) pairs, best first.
+
+        Every word in the query has to match. The last word is treated as a
+        prefix, since it's usually still being typed.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        scores = None
+        for i, word in enumerate(words):
+            matches = self._match(word, prefix=(i == len(words) - 1))
+            if scores is None:
+                scores = matches
+            else:
+                scores = {position: score + matches[position]
+                          for position, score in scores.items() if position in matches}
+            if not scores:
+                return []
+
+        # Whole query at the start of the artist or title, e.g. "pink fl"
+        phrase = ' '.join(words)
+        for position in scores:
+            artist, title = self.folded_titles[position]
+            if artist.startswith(phrase) or title.startswith(phrase):
+                scores[position] += 2.0
+
+        # Ties go to the higher-placed album
+        best = sorted(scores.items(), key=lambda item: (-item[1], self.albums[item[0]].rank))
+        return [(self.albums[position], round(score, 3)) for position, score in best[:limit]]
+
+    def _match(self, word, prefix):
+        matches = dict(self.postings.get(word, {}))
+
+        if word.isdigit() and int(word) in self.by_rank:
+            position = self.by_rank[int(word)]
+            matches[position] = matches.get(position, 0.0) + RANK_MATCH_SCORE
+
+        if prefix:
+            words = self.prefix_words
+            for i in range(bisect.bisect_left(words, word), len(words)):
+                candidate = words[i]
+                if not candidate.startswith(word):
+                    break
+                if candidate == word:
+                    continue
+                for position, weight in self.prefix_postings[candidate].items():
+                    # A partial word counts for less than a whole one, and
+                    # only its best-scoring completion counts per album
+                    score = weight * PREFIX_FACTOR
+                    if score > matches.get(position, 0.0):
+                        matches[position] = score
+        return matches
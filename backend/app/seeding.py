@@ -0,0 +1,131 @@
+import csv
+import io
+
+CSV_COLUMNS = ('Rank', 'Artist', 'Album', 'Info', 'Description')
+
+STAGING_DDL = """
+    CREATE TEMP TABLE albums_staging (
+        rank INTEGER NOT NULL,
+        artist VARCHAR(255) NOT NULL,
+        album VARCHAR(255) NOT NULL,
+        info TEXT,
+        description TEXT
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY albums_staging (rank, artist, album, info, description) FROM STDIN WITH (FORMAT csv)"
+
+# One statement merges the whole file. Rows whose content is unchanged are
+# filtered out by the WHERE on the DO UPDATE, so they are neither rewritten
+# nor returned; xmax = 0 tells freshly inserted rows from updated ones.
+MERGE_SQL = """
+    INSERT INTO albums (rank, artist, album, info, description)
+    SELECT rank, artist, album, info, description FROM albums_staging
+    ON CONFLICT (rank) DO UPDATE
+    SET artist = EXCLUDED.artist,
+        album = EXCLUDED.album,
+        info = EXCLUDED.info,
+        description = EXCLUDED.description
+    WHERE (albums.artist, albums.album, albums.info, albums.description)
+          IS DISTINCT FROM
+          (EXCLUDED.artist, EXCLUDED.album, EXCLUDED.info, EXCLUDED.description)
+    RETURNING rank, (xmax = 0) AS inserted
+"""
+
+MISSING_SQL = """
+    SELECT rank FROM albums
+    WHERE rank NOT IN (SELECT rank FROM albums_staging)
+    ORDER BY rank DESC
+"""
+
+BUMP_VERSION_SQL = """
+    INSERT INTO catalog_version (id, version, updated_at)
+    VALUES (1, 1, now())
+    ON CONFLICT (id) DO UPDATE
+    SET version = catalog_version.version + 1, updated_at = now()
+"""
+
+
+def clean_value(value):
+    # The source CSV has stray byte-order marks inside some fields (rank 500
+    # is stored as U+FEFF + "Funeral"); they are invisible but break equality
+    # and search.
+    return value.replace('\ufeff', '') if value else value
+
+
+def read_albums_csv(csv_filepath):
+    with open(csv_filepath, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield tuple(clean_value(row.get(column)) for column in CSV_COLUMNS)
+
+
+def load_albums(conn, csv_filepath, apply=True):
+    """Merge the album CSV into the albums table over a DB-API connection.
+
+    The file is COPYed into a temporary staging table and merged with a
+    single upsert, all in one transaction. With apply=False the changes are
+    computed and reported but rolled back. Returns a dict of rank lists:
+    inserted, updated, unchanged and missing (in the table but not the CSV).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    staged = 0
+    for row in read_albums_csv(csv_filepath):
+        writer.writerow(row)
+        staged += 1
+    buffer.seek(0)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(STAGING_DDL)
+        if hasattr(cur, 'copy_expert'):
+            # psycopg2
+            cur.copy_expert(COPY_SQL, buffer)
+        else:
+            # pg8000, as used with the Cloud SQL connector
+            cur.execute(COPY_SQL, stream=buffer)
+
+        cur.execute(MERGE_SQL)
+        changed = cur.fetchall()
+        cur.execute(MISSING_SQL)
+        missing = [row[0] for row in cur.fetchall()]
+
+        inserted = sorted((rank for rank, was_inserted in changed if was_inserted), reverse=True)
+        updated = sorted((rank for rank, was_inserted in changed if not was_inserted), reverse=True)
+
+        if apply and changed:
+            # Tell running app workers to reload their album catalog
+            cur.execute(BUMP_VERSION_SQL)
+
+        if apply:
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return {
+        'staged': staged,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': staged - len(inserted) - len(updated),
+        'missing': missing,
+    }
+
+
+def print_report(result, apply=True, verbose=False):
+    prefix = '' if apply else '[dry run] '
+    print(f"{prefix}{result['staged']} albums in CSV: "
+          f"{len(result['inserted'])} inserted, {len(result['updated'])} updated, "
+          f"{result['unchanged']} unchanged")
+    if verbose:
+        if result['inserted']:
+            print(f"  inserted ranks: {', '.join(map(str, result['inserted']))}")
+        if result['updated']:
+            print(f"  updated ranks: {', '.join(map(str, result['updated']))}")
+    if result['missing']:
+        print(f"  {len(result['missing'])} ranks in the database are not in the CSV "
+              f"(left in place): {', '.join(map(str, result['missing']))}")
@@ -0,0 +1,94 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import request
+
+# Taken when the app package is first imported: in the gunicorn master when
+# preloading, otherwise in each worker. CLOCK_MONOTONIC is shared across
+# fork, so workers can measure from the same point.
+PROCESS_STARTED_AT = time.monotonic()
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def report(self):
+        return {
+            'phases_ms': dict(self.phases),
+            'total_ms': round((time.perf_counter() - self.started_at) * 1000, 1),
+        }
+
+
+def log_startup(app, timer):
+    report = timer.report()
+    app.extensions['startup'] = report
+    phases = ', '.join(f'{name} {ms}ms' for name, ms in report['phases_ms'].items())
+    app.logger.info(f"create_app() finished in {report['total_ms']}ms ({phases})")
+
+
+def track_first_request(app):
+    # Logs, once per worker, how long after process start the first request
+    # succeeded; with preload that includes the time to fork and warm up.
+    state = {'pid': None}
+
+    @app.after_request
+    def record_first_success(response):
+        if state['pid'] != os.getpid() and response.status_code < 400:
+            state['pid'] = os.getpid()
+            elapsed = round((time.monotonic() - PROCESS_STARTED_AT) * 1000, 1)
+            app.extensions.setdefault('startup', {})['first_request_ms'] = elapsed
+            app.logger.info(
+                f'First successful request ({request.path}) in worker {os.getpid()} '
+                f'{elapsed}ms after process start'
+            )
+        return response
+
+
+def warm_pool(app):
+    """Open the worker's pool connections before the first request needs one."""
+    from app import db
+
+    timer = StartupTimer()
+    with timer.phase('pool'):
+        with app.app_context():
+            pool = db.engine.pool
+            size = pool.size() if hasattr(pool, 'size') else 1
+            connections = []
+            try:
+                for _ in range(size):
+                    connections.append(db.engine.connect())
+            except Exception as e:
+                app.logger.warning(f'Connection pool warm-up failed: {e}')
+            finally:
+                for connection in connections:
+                    connection.close()
+    app.logger.info(f"Worker {os.getpid()} opened {len(connections)} DB connections in {timer.phases['pool']}ms")
+
+
+def precompress_catalog(app):
+    """Compress the full catalog, GET /api/albums without parameters, at the
+    highest level before any request asks for it. After a reseed the new
+    catalog is compressed at the normal level, like any other response."""
+    from app import catalog, response_compression
+    from app.routes import albums_etag, albums_page
+
+    timer = StartupTimer()
+    with timer.phase('precompress'):
+        with app.app_context():
+            snapshot = catalog.snapshot
+            if not snapshot.albums:
+                return
+            body = app.json.response(albums_page(snapshot)).get_data()
+            response_compression.precompress(albums_etag(snapshot), body)
+    app.logger.info(f"Precompressed the album catalog in {timer.phases['precompress']}ms")
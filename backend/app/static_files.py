@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from collections import namedtuple
+
+from flask import Response, request, send_file
+
+# Vite writes content-hashed bundles such as assets/index-B4Jd2_xk.js; their
+# URL changes whenever their content does, so browsers may keep them forever.
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Preference order when the client accepts several
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+StaticAsset = namedtuple('StaticAsset', ['path', 'mimetype', 'etag', 'variants', 'cache_control'])
+
+
+class StaticFiles:
+    """Serves the built frontend from an index made once at startup.
+
+    Requests are answered from a dict lookup instead of touching the
+    filesystem to find out what exists. `.br` and `.gz` files written next
+    to the originals at image build time are sent to clients that accept
+    them. index.html, which every client-side route returns, is kept in
+    memory in each encoding.
+    """
+
+    def __init__(self, app=None):
+        self.assets = {}
+        self.index = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.assets = scan_static_folder(app.static_folder)
+        self.index = InMemoryFile(os.path.join(app.static_folder, 'index.html'))
+        app.extensions['static_files'] = self
+        app.logger.info(f'Indexed {len(self.assets)} static files in {app.static_folder}')
+
+    def serve(self, path):
+        asset = self.assets.get(path)
+        if asset is None:
+            # A missing bundle must not be answered with HTML
+            if path.startswith('assets/'):
+                return {'error': 'Not found'}, 404
+            return self.index.response()
+        if path == 'index.html':
+            return self.index.response()
+
+        encoding = None
+        filename = asset.path
+        for name, _ in ENCODINGS:
+            if name in asset.variants and _accepts(name):
+                encoding, filename = name, asset.variants[name]
+                break
+
+        response = send_file(
+            filename,
+            mimetype=asset.mimetype,
+            etag=f'{asset.etag}-{encoding}' if encoding else asset.etag,
+            conditional=True,
+            max_age=None,
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = asset.cache_control
+        return response
+
+
+class InMemoryFile:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = hashlib.sha1(content).hexdigest()[:16]
+        self.bodies = {None: content}
+        for name, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    self.bodies[name] = f.read()
+        if 'gzip' not in self.bodies:
+            self.bodies['gzip'] = gzip.compress(content, compresslevel=9)
+
+    def response(self):
+        encoding = next((name for name, _ in ENCODINGS if name in self.bodies and _accepts(name)), None)
+        etag = f'{self.etag}-{encoding}' if encoding else self.etag
+        response = Response(self.bodies[encoding], mimetype=self.mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = REVALIDATE
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response.make_conditional(request)
+
+
+def scan_static_folder(root):
+    """Map each URL path under `root` to a StaticAsset."""
+    files = set()
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            files.add(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/'))
+
+    assets = {}
+    for path in files:
+        if any(path.endswith(suffix) and path[:-len(suffix)] in files for _, suffix in ENCODINGS):
+            continue
+        full_path = os.path.join(root, path)
+        stat = os.stat(full_path)
+        variants = {}
+        for name, suffix in ENCODINGS:
+            # Only worth sending if compression actually made it smaller
+            if path + suffix in files and os.path.getsize(full_path + suffix) < stat.st_size:
+                variants[name] = full_path + suffix
+        assets[path] = StaticAsset(
+            path=full_path,
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            etag=f'{stat.st_mtime_ns:x}-{stat.st_size:x}',
+            variants=variants,
+            cache_control=IMMUTABLE if HASHED_ASSET.match(path) else REVALIDATE,
+        )
+    return assets
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
@@ -0,0 +1,18 @@
+from app import create_app, db
+from app.queries import backfill_user_stats
+
+def main():
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            updated = backfill_user_stats()
+            db.session.commit()
+            print(f"Backfilled stats for {updated} users")
+        except Exception as e:
+            print(f"Error backfilling user stats: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""Load test for the countdown flow.
+
+Boots create_app() against a local database seeded from the album CSV and
+runs simulated users through register, login, onboarding, and a loop of
+rate-and-complete with dashboard views mixed in. Reports throughput and,
+per endpoint, p50/p95/p99 latency and SQL statements per request.
+
+    python benchmark.py                               # throwaway SQLite file
+    python benchmark.py --database postgresql://postgres@localhost/albums_bench
+    python benchmark.py --save-baseline               # record benchmark_baseline.json
+    python benchmark.py --gate-latency --baseline my_baseline.json
+
+Results are compared with benchmark_baseline.json, and the run exits with
+status 1 if any endpoint issues more SQL statements per request than the
+baseline allows. Those counts are the same on every machine. Mean counts
+are compared against a baseline taken with the same database kind, user
+count and concurrency; otherwise only the most statements any one request
+issued is compared.
+
+Latency depends on the machine, so p95 is only gated with --gate-latency,
+and then only against a baseline recorded on the same host with the same
+setup. Record one with --save-baseline --baseline <file> first.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def find_csv():
+    # Same lookup as seed.py: Docker layout first, then the repo root
+    for path in ('rolling_stone_top_500_albums_2020.csv', '../rolling_stone_top_500_albums_2020.csv'):
+        if os.path.exists(path):
+            return path
+    raise SystemExit('ERROR: rolling_stone_top_500_albums_2020.csv not found')
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank, so p99 of a small sample is its slowest request
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects (endpoint, latency, SQL statements, status) for every request."""
+
+    def __init__(self, app):
+        self.samples = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        from flask import g, request
+
+        # Registered after create_app(), so it runs before the metrics hook
+        # that owns g.query_count (after_request hooks run in reverse).
+        @app.after_request
+        def capture(response):
+            self._local.endpoint = request.endpoint or 'none'
+            self._local.queries = g.get('query_count', 0)
+            return response
+
+    def call(self, client, method, path, expected=(200,), **kwargs):
+        self._local.endpoint, self._local.queries = None, 0
+        start = time.perf_counter()
+        response = getattr(client, method)(path, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.append((
+                self._local.endpoint or path, elapsed, self._local.queries,
+                response.status_code, response.status_code in expected,
+            ))
+        if response.status_code not in expected:
+            raise RuntimeError(f'{method.upper()} {path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return response
+
+    def summary(self, wall_seconds):
+        by_endpoint = {}
+        for endpoint, elapsed, queries, status, ok in self.samples:
+            by_endpoint.setdefault(endpoint, []).append((elapsed, queries, ok))
+
+        endpoints = {}
+        for endpoint, rows in sorted(by_endpoint.items()):
+            latencies = sorted(elapsed * 1000 for elapsed, _, _ in rows)
+            queries = [q for _, q, _ in rows]
+            endpoints[endpoint] = {
+                'count': len(rows),
+                'errors': sum(1 for _, _, ok in rows if not ok),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_mean': round(sum(queries) / len(queries), 3),
+                'queries_max': max(queries),
+            }
+        return {
+            'requests': len(self.samples),
+            'wall_seconds': round(wall_seconds, 3),
+            'throughput_rps': round(len(self.samples) / wall_seconds, 1) if wall_seconds else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+def journey(app, recorder, name, rng, args):
+    client = app.test_client()
+    recorder.call(client, 'post', '/api/auth/register', expected=(201,),
+                  json={'username': name, 'email': f'{name}@bench.local', 'password': 'benchmark-password'})
+    response = recorder.call(client, 'post', '/api/auth/login',
+                             json={'username': name, 'password': 'benchmark-password'})
+    headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    recorder.call(client, 'get', '/api/auth/me', headers=headers)
+    recorder.call(client, 'get', '/api/progress', expected=(404,), headers=headers)
+    # Onboarding lists the albums to pick a starting point from
+    recorder.call(client, 'get', '/api/albums?fields=id,rank,artist,album', headers=headers)
+
+    start_rank = args.start_rank or rng.randint(args.albums_per_user + 1, 500)
+    response = recorder.call(client, 'post', '/api/progress/initialize', expected=(201,),
+                             headers=headers, json={'album_rank': start_rank})
+    album = response.get_json()['current_album']
+
+    for completed in range(1, args.albums_per_user + 1):
+        recorder.call(client, 'get', '/api/progress', headers=headers)
+        recorder.call(client, 'get', f"/api/albums/{album['id']}/stats", headers=headers)
+        # Most albums get a rating; some are completed without one
+        rating = rng.randint(1, 5) if rng.random() < 0.8 else None
+        response = recorder.call(client, 'post', '/api/progress/complete-and-rate', headers=headers,
+                                 json={'album_id': album['id'], 'rating': rating})
+        data = response.get_json()
+        if data['all_completed']:
+            break
+        album = data['next_album']
+
+        if completed % args.dashboard_every == 0:
+            sort = rng.choice(('date', 'rating', 'rank'))
+            recorder.call(client, 'get', f'/api/dashboard?sort={sort}&page=1&per_page=50', headers=headers)
+
+
+def setup_database(app, csv_file):
+    from app import catalog, db
+    from app.models import Album, CatalogVersion
+    from app.seeding import load_albums, read_albums_csv
+
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Album.id).first() is None:
+            if db.engine.dialect.name == 'postgresql':
+                conn = db.engine.raw_connection()
+                try:
+                    load_albums(conn, csv_file)
+                finally:
+                    conn.close()
+            else:
+                for rank, artist, album, info, description in read_albums_csv(csv_file):
+                    db.session.add(Album(rank=int(rank), artist=artist, album=album,
+                                         info=info, description=description))
+                db.session.add(CatalogVersion(id=1, version=1))
+                db.session.commit()
+        catalog.reload()
+
+
+def host_fingerprint():
+    # Latencies are only comparable between runs on the same machine
+    return f'{platform.node()} {platform.machine()} {os.cpu_count()} CPUs Python {platform.python_version()}'
+
+
+def compare(result, baseline, args):
+    """Return a list of regressions of result against baseline."""
+    regressions = []
+    setup = ('database', 'users', 'albums_per_user', 'concurrency')
+    same_setup = all(baseline.get(key) == result[key] for key in setup)
+    if not same_setup:
+        taken_with = ', '.join(f'{key}={baseline.get(key)}' for key in setup)
+        print(f"Baseline was taken with {taken_with}; comparing only the most SQL statements per request")
+
+    gate_latency = args.gate_latency and same_setup and baseline.get('host') == result['host']
+    if args.gate_latency and not gate_latency:
+        print(f"Baseline was taken on {baseline.get('host') or 'an unknown host'} or with another setup; "
+              f"not comparing latency")
+
+    # Cache hits depend on how many users share albums, so the mean number of
+    # statements is only comparable for the same setup; the maximum always is.
+    query_stat = 'queries_mean' if same_setup else 'queries_max'
+
+    for endpoint, current in result['endpoints'].items():
+        previous = baseline['endpoints'].get(endpoint)
+        if previous is None:
+            continue
+        if current[query_stat] > previous[query_stat] + args.max_query_regression:
+            regressions.append(
+                f"{endpoint}: {query_stat} {current[query_stat]} SQL statements per request "
+                f"(baseline {previous[query_stat]})"
+            )
+        # Ignore sub-millisecond wobble on endpoints that are already fast
+        allowed = max(previous['p95_ms'] * (1 + args.max_latency_regression),
+                      previous['p95_ms'] + args.min_latency_delta_ms)
+        if gate_latency and current['p95_ms'] > allowed:
+            regressions.append(
+                f"{endpoint}: p95 {current['p95_ms']}ms (baseline {previous['p95_ms']}ms, "
+                f"allowed {round(allowed, 3)}ms)"
+            )
+    return regressions
+
+
+def print_summary(result):
+    print(f"\n{result['requests']} requests in {result['wall_seconds']}s "
+          f"({result['throughput_rps']} req/s) on {result['database']}, "
+          f"{result['users']} users x {result['albums_per_user']} albums, "
+          f"concurrency {result['concurrency']}\n")
+    print(f"{'endpoint':<34} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql/req':>8} {'sql max':>8}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"{endpoint:<34} {stats['count']:>6} {stats['errors']:>4} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['queries_mean']:>8} {stats['queries_max']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the countdown flow against a local database")
+    parser.add_argument('--database', help="SQLAlchemy URL of a dedicated database (default: a temporary SQLite file)")
+    parser.add_argument('--users', type=int, default=20, help="Simulated users (default 20)")
+    parser.add_argument('--albums-per-user', type=int, default=30, help="Albums each user completes (default 30)")
+    # More than one at a time measures contention, but latency then varies too
+    # much between runs to gate on; compare such runs with their own baseline.
+    parser.add_argument('--concurrency', type=int, default=1, help="Users running at once (default 1)")
+    parser.add_argument('--dashboard-every', type=int, default=10, help="View the dashboard every N albums (default 10)")
+    parser.add_argument('--start-rank', type=int, help="Rank every user starts at (default: random per user)")
+    parser.add_argument('--seed', type=int, default=500, help="Random seed for the user journeys")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare with or write")
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run as the new baseline")
+    parser.add_argument('--output', help="Also write this run's results to a JSON file")
+    parser.add_argument('--gate-latency', action='store_true',
+                        help="Also fail on p95 regressions; needs a baseline recorded on this host")
+    parser.add_argument('--max-latency-regression', type=float, default=0.25,
+                        help="Allowed p95 increase as a fraction of the baseline (default 0.25)")
+    parser.add_argument('--min-latency-delta-ms', type=float, default=2.0,
+                        help="p95 increases below this many ms are never regressions (default 2)")
+    parser.add_argument('--max-query-regression', type=float, default=0.0,
+                        help="Allowed increase in mean SQL statements per request (default 0)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.database:
+        database_url = args.database
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='albums-bench-')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    # Config reads the environment when the app package is imported
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('METRICS_QUERY_BUDGET', '0')
+    # The journey completes albums far faster than any person would
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+    from app import create_app
+
+    try:
+        app = create_app()
+        setup_database(app, find_csv())
+        recorder = Recorder(app)
+
+        # Unique names so repeated runs against the same Postgres don't collide
+        run_id = uuid.uuid4().hex[:8]
+        jobs = [(f'bench-{run_id}-{i}', random.Random(args.seed + i)) for i in range(args.users)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = [executor.submit(journey, app, recorder, name, rng, args) for name, rng in jobs]
+            failures = [future.exception() for future in futures if future.exception()]
+        wall_seconds = time.perf_counter() - start
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    result = recorder.summary(wall_seconds)
+    result.update({
+        'database': 'postgresql' if database_url.startswith('postgres') else database_url.split(':', 1)[0],
+        'users': args.users,
+        'albums_per_user': args.albums_per_user,
+        'concurrency': args.concurrency,
+        'host': host_fingerprint(),
+    })
+    print_summary(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if failures:
+        for failure in failures[:5]:
+            print(f"Journey failed: {failure}")
+        raise SystemExit(1)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import time
+
+from app import create_app, db
+from app.recommendations import compute_neighbors
+
+def run(app, full):
+    with app.app_context():
+        try:
+            started = time.perf_counter()
+            summary = compute_neighbors(
+                app.config['RECOMMENDATION_NEIGHBORS'],
+                app.config['RECOMMENDATION_MIN_RATINGS'],
+                full=full,
+            )
+            db.session.commit()
+            print(
+                f"{summary['users']} users: recomputed {summary['changed']} changed and "
+                f"{summary['affected']} affected, {summary['neighbors']} neighbours stored "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        except Exception as e:
+            print(f"Error computing recommendations: {e}")
+            db.session.rollback()
+            raise
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute user_neighbors for /api/recommendations")
+    parser.add_argument('--full', action='store_true', help="Recompute every user, not just those with new ratings")
+    parser.add_argument('--loop', type=float, metavar='SECONDS', help="Keep running incrementally, this many seconds apart")
+    args = parser.parse_args()
+
+    app = create_app()
+    run(app, args.full)
+    while args.loop:
+        time.sleep(args.loop)
+        run(app, False)
+
+if __name__ == "__main__":
+    main()
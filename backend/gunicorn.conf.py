@@ -0,0 +1,45 @@
+# Picked up automatically by gunicorn when started from this directory.
+import os
+import shutil
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+timeout = 60
+
+# Build the app (config, catalog, routes, index.html) once in the master and
+# fork workers from it, instead of every worker repeating that work on a
+# cold instance. Set PRELOAD_APP=false to go back to per-worker loading.
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() in ('1', 'true', 'yes')
+
+# Each worker writes its request metrics here for /metrics to add up.
+# Cleared here, before the app is loaded, so every gunicorn run starts at zero.
+os.environ.setdefault('METRICS_DIR', '/tmp/albums-metrics')
+shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def when_ready(server):
+    # With preload, compress the catalog once in the master; the workers
+    # inherit the bodies when they are forked
+    if preload_app:
+        from app.startup import precompress_catalog
+        from wsgi import app
+
+        precompress_catalog(app)
+
+
+def post_fork(server, worker):
+    from app import db
+    from app.database import install_statement_timeout
+    from app.startup import precompress_catalog, warm_pool
+    from wsgi import app
+
+    if preload_app:
+        # Connections opened in the master (e.g. loading the catalog) must not
+        # be shared with the children; drop them without closing the sockets.
+        with app.app_context():
+            db.engine.dispose(close=False)
+    else:
+        precompress_catalog(app)
+    install_statement_timeout(app)
+    warm_pool(app)
@@ -0,0 +1,30 @@
+"""Add catalog_version stamp used to invalidate the in-process album catalog
+
+Revision ID: 002_catalog_version
+Revises: 001_initial_complete
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002_catalog_version'
+down_revision = '001_initial_complete'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO catalog_version (id, version, updated_at) VALUES (1, 1, now())')
+
+
+def downgrade():
+    op.drop_table('catalog_version')
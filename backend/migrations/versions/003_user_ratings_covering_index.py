@@ -0,0 +1,29 @@
+"""Covering index for listing a user's ratings
+
+Revision ID: 003_user_ratings_covering_index
+Revises: 002_catalog_version
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003_user_ratings_covering_index'
+down_revision = '002_catalog_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/ratings reads every column it needs straight from this index
+    op.create_index(
+        'ix_user_ratings_user_album_covering',
+        'user_ratings',
+        ['user_id', 'album_id'],
+        postgresql_include=['id', 'rating', 'created_at']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_ratings_user_album_covering', table_name='user_ratings')
@@ -0,0 +1,37 @@
+"""Add user_stats summary table
+
+Revision ID: 004_user_stats
+Revises: 003_user_ratings_covering_index
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004_user_stats'
+down_revision = '003_user_ratings_covering_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populate for existing users afterwards with backfill_user_stats.py
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('rated_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_1', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_2', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_3', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_4', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_5', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_activity_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
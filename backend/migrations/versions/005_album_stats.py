@@ -0,0 +1,36 @@
+"""Add album_stats community aggregate table
+
+Revision ID: 005_album_stats
+Revises: 004_user_stats
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_album_stats'
+down_revision = '004_user_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populate for existing ratings afterwards with rebuild_album_stats.py
+    op.create_table('album_stats',
+        sa.Column('album_id', sa.Integer(), nullable=False),
+        sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_1', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_2', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_3', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_4', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stars_5', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['album_id'], ['albums.id'], ),
+        sa.PrimaryKeyConstraint('album_id')
+    )
+
+
+def downgrade():
+    op.drop_table('album_stats')
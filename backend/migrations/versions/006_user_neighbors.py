@@ -0,0 +1,41 @@
+"""Add user_neighbors and recommendation_state for recommendations
+
+Revision ID: 006_user_neighbors
+Revises: 005_album_stats
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_user_neighbors'
+down_revision = '005_album_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populate afterwards with compute_recommendations.py
+    op.create_table('user_neighbors',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('neighbor_id', sa.Integer(), nullable=False),
+        sa.Column('similarity', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['neighbor_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'neighbor_id')
+    )
+    op.create_index('ix_user_neighbors_neighbor_id', 'user_neighbors', ['neighbor_id'], unique=False)
+    op.create_table('recommendation_state',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('recommendation_state')
+    op.drop_index('ix_user_neighbors_neighbor_id', table_name='user_neighbors')
+    op.drop_table('user_neighbors')
@@ -0,0 +1,32 @@
+"""Add sync_actions for idempotent POST /api/sync
+
+Revision ID: 007_sync_actions
+Revises: 006_user_neighbors
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_sync_actions'
+down_revision = '006_user_neighbors'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_actions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('client_time', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_actions')
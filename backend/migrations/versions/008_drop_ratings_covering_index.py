@@ -0,0 +1,31 @@
+"""Drop the covering index on user_ratings
+
+Revision ID: 008_drop_ratings_covering_index
+Revises: 007_sync_actions
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_drop_ratings_covering_index'
+down_revision = '007_sync_actions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/ratings sorts by albums.rank, which no user_ratings index can
+    # provide; the planner reads a user's rows through _user_album_uc either
+    # way, so this index only added a second write to every rating.
+    op.drop_index('ix_user_ratings_user_album_covering', table_name='user_ratings')
+
+
+def downgrade():
+    op.create_index(
+        'ix_user_ratings_user_album_covering',
+        'user_ratings',
+        ['user_id', 'album_id'],
+        postgresql_include=['id', 'rating', 'created_at']
+    )
@@ -0,0 +1,33 @@
+import argparse
+
+from app import cache, create_app, db
+from app.queries import rebuild_album_stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute album_stats from user_ratings")
+    parser.add_argument('--check', action='store_true', help="Only report drift, don't write")
+    args = parser.parse_args()
+
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            drift = rebuild_album_stats(apply=not args.check)
+            for album_id, (stored, expected) in sorted(drift.items()):
+                print(f"Album {album_id}: stored {stored}, expected {expected}")
+            print(f"{len(drift)} albums had drifted")
+            
+            if args.check:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                # Reaches the workers too unless CACHE_BACKEND is local
+                cache.namespace('community').invalidate()
+                print("album_stats rebuilt")
+        except Exception as e:
+            print(f"Error rebuilding album stats: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from app import create_app
+from app.database import install_statement_timeout
 
 app = create_app()
+install_statement_timeout(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
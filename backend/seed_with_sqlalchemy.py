@@ -1,53 +1,30 @@
-import csv
+import argparse
 import os
-from sqlalchemy import create_engine, text
-from app.models import Album
 from app import create_app, db
+from app.seeding import load_albums, print_report
 
-def seed_albums_table(csv_filepath):
+def seed_albums_table(csv_filepath, apply=True, verbose=False):
     app = create_app()
     
     with app.app_context():
+        # Same loader as seed.py, but over the app's own engine so it picks up
+        # whatever connection settings the app is configured with.
+        conn = db.engine.raw_connection()
         try:
-            # Check if albums already exist
-            existing_count = Album.query.count()
-            print(f"Existing albums in database: {existing_count}")
-            
-            if existing_count > 0:
-                print("Albums already seeded, skipping...")
-                return
-            
-            with open(csv_filepath, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                albums_added = 0
-                
-                for row in reader:
-                    album = Album(
-                        rank=int(row['Rank']),
-                        artist=row['Artist'],
-                        album=row['Album'],
-                        info=row.get('Info', ''),
-                        description=row.get('Description', '')
-                    )
-                    db.session.add(album)
-                    albums_added += 1
-                    
-                    if albums_added % 50 == 0:
-                        print(f"Added {albums_added} albums...")
-                
-                db.session.commit()
-                print(f"Successfully seeded {albums_added} albums!")
-                
-                # Verify
-                final_count = Album.query.count()
-                print(f"Total albums in database: {final_count}")
-                
+            result = load_albums(conn, csv_filepath, apply=apply)
+            print_report(result, apply=apply, verbose=verbose)
         except Exception as e:
             print(f"Error seeding albums table: {e}")
-            db.session.rollback()
             raise
+        finally:
+            conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the album CSV into the albums table")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+    parser.add_argument('--verbose', action='store_true', help="List the ranks that were inserted or updated")
+    args = parser.parse_args()
+
     # In Docker, the CSV is in the same directory
     csv_file = 'rolling_stone_top_500_albums_2020.csv'
     if not os.path.exists(csv_file):
@@ -59,4 +36,4 @@ if __name__ == "__main__":
         exit(1)
         
     print(f"Using CSV file: {csv_file}")
-    seed_albums_table(csv_file)
\ No newline at end of file
+    seed_albums_table(csv_file, apply=not args.dry_run, verbose=args.verbose)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+# Config is read when the app package is imported, so these come first
+_tmp = tempfile.mkdtemp(prefix='albums-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp, "test.db")}'
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['RATING_WRITE_BEHIND'] = 'false'
+os.environ['CACHE_BACKEND'] = 'local'
+
+import pytest
+from sqlalchemy import delete
+
+from app import cache, catalog, create_app, db
+from app.models import (
+    Album, AlbumStats, CatalogVersion, RecommendationState, SyncAction, User,
+    UserNeighbor, UserProgress, UserRating, UserStats,
+)
+
+# Enough albums for a lookahead of MAX_LOOKAHEAD (50) and then some
+ALBUM_COUNT = 60
+
+# Child tables first
+USER_TABLES = (
+    SyncAction, UserNeighbor, RecommendationState, UserRating, UserStats,
+    AlbumStats, UserProgress, User,
+)
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            Album(id=rank, rank=rank, artist=f'Artist {rank}', album=f'Album {rank}')
+            for rank in range(1, ALBUM_COUNT + 1)
+        )
+        db.session.add(CatalogVersion(id=1, version=1))
+        db.session.commit()
+        catalog.reload()
+    return app
+
+
+@pytest.fixture(autouse=True)
+def clean_tables(app):
+    yield
+    with app.app_context():
+        db.session.rollback()
+        for model in USER_TABLES:
+            db.session.execute(delete(model))
+        db.session.commit()
+    cache.backend._data.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(client):
+    """Registers and logs in a user; returns the Authorization headers."""
+    def make_user(username='listener'):
+        client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': 'secret',
+        })
+        response = client.post('/api/auth/login', json={'username': username, 'password': 'secret'})
+        return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+    return make_user
+
+
+@pytest.fixture
+def headers(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def start_at(client, headers):
+    """Starts the logged-in user's countdown at the given rank."""
+    def start_at(rank):
+        response = client.post('/api/progress/initialize', json={'album_rank': rank}, headers=headers)
+        assert response.status_code == 201
+    return start_at
@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+from app.cache import Cache, LocalBackend, RedisBackend, SharedMemoryBackend, TTLCache
+
+
+def local_backend(tmp_path):
+    return LocalBackend(maxsize=100)
+
+
+def shared_backend(tmp_path):
+    return SharedMemoryBackend(str(tmp_path / 'cache'), slots=64, slot_size=256)
+
+
+def redis_backend(tmp_path):
+    fakeredis = pytest.importorskip('fakeredis')
+    backend = RedisBackend('redis://localhost:6379/0', timeout=0.25)
+    backend._client = fakeredis.FakeRedis()
+    return backend
+
+
+@pytest.fixture(params=[local_backend, shared_backend, redis_backend], ids=['local', 'shared', 'redis'])
+def backend(request, tmp_path):
+    return request.param(tmp_path)
+
+
+@pytest.fixture
+def cache(backend):
+    cache = Cache()
+    cache.prefix = 'test'
+    cache.backend = backend
+    return cache
+
+
+def test_ttl_cache_expires_and_evicts():
+    ttl_cache = TTLCache(ttl=60, maxsize=2)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2, ttl=0)
+    ttl_cache.set('c', 3)
+    ttl_cache.set('d', 4)
+
+    assert ttl_cache.get('b') is None
+    # 'a' was the least recently used of the three live entries
+    assert [ttl_cache.get(key) for key in 'acd'] == [None, 3, 4]
+
+
+def test_backend_get_set_delete(backend):
+    assert backend.set('a', b'1')
+    backend.set('b', b'2', ttl=60)
+
+    assert backend.get_many(['a', 'b', 'missing']) == [b'1', b'2', None]
+    backend.delete('a')
+    assert backend.get_many(['a', 'b']) == [None, b'2']
+
+
+def test_backend_entries_expire(backend):
+    backend.set('a', b'1', ttl=0.05)
+
+    time.sleep(0.1)
+
+    assert backend.get_many(['a']) == [None]
+
+
+def test_backend_incr(backend):
+    assert backend.incr('counter', 10) == 11
+    assert backend.incr('counter', 10) == 12
+    assert int(backend.get_many(['counter'])[0]) == 12
+
+
+def test_shared_backend_skips_values_too_big_for_a_slot(tmp_path):
+    backend = shared_backend(tmp_path)
+
+    assert not backend.set('big', b'x' * 256)
+    assert backend.get_many(['big']) == [None]
+
+
+def test_shared_backend_is_shared_by_every_mapping_of_the_file(tmp_path):
+    writer, reader = shared_backend(tmp_path), shared_backend(tmp_path)
+
+    writer.set('a', b'1')
+
+    assert reader.get_many(['a']) == [b'1']
+
+
+def test_shared_backend_replaces_the_entry_expiring_soonest(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / 'cache'), slots=SharedMemoryBackend.PROBES, slot_size=64)
+    # Every key probes the same PROBES slots
+    for i in range(SharedMemoryBackend.PROBES):
+        backend.set(f'k{i}', b'v', ttl=None if i else 60)
+
+    backend.set('new', b'v')
+
+    assert backend.get_many(['k0', 'k1', 'new']) == [None, b'v', b'v']
+
+
+def test_namespace_get_set(cache):
+    users = cache.namespace('users', ttl=60)
+
+    assert users.get(1, 'default') == 'default'
+    users.set(1, {'name': 'listener'})
+    users.set(('a', 2), [1, 2])
+
+    assert users.get(1) == {'name': 'listener'}
+    assert users.get(('a', 2)) == [1, 2]
+    users.delete(1)
+    assert users.get(1) is None
+    assert users.stats == {
+        'hits': 2, 'misses': 2, 'sets': 2, 'skipped': 0, 'invalidations': 0, 'errors': 0,
+    }
+
+
+def test_namespace_invalidate_drops_only_that_namespace(cache):
+    users, albums = cache.namespace('users'), cache.namespace('albums')
+    users.set(1, 'user')
+    albums.set(1, 'album')
+
+    users.invalidate()
+
+    assert users.get(1) is None
+    assert albums.get(1) == 'album'
+    users.set(1, 'user again')
+    assert users.get(1) == 'user again'
+    assert users.stats['invalidations'] == 1
+
+
+def test_namespace_invalidation_reaches_other_processes(tmp_path):
+    # Two workers, each with its own Cache over the same shared file
+    first, second = Cache(), Cache()
+    first.backend, second.backend = shared_backend(tmp_path), shared_backend(tmp_path)
+    first.namespace('users').set(1, 'user')
+    assert second.namespace('users').get(1) == 'user'
+
+    first.namespace('users').invalidate()
+
+    assert second.namespace('users').get(1) is None
+
+
+def test_namespace_counts_skipped_values(tmp_path):
+    cache = Cache()
+    cache.backend = shared_backend(tmp_path)
+    users = cache.namespace('users')
+
+    users.set(1, 'x' * 256)
+
+    assert users.get(1) is None
+    assert users.stats['skipped'] == 1
+
+
+def test_namespace_survives_the_backend_going_away():
+    pytest.importorskip('redis')
+    cache = Cache()
+    # Nothing listens on port 1
+    cache.backend = RedisBackend('redis://127.0.0.1:1/0', timeout=0.1)
+    users = cache.namespace('users')
+
+    users.set(1, 'user')
+    users.invalidate()
+    users.delete(1)
+
+    assert users.get(1, 'default') == 'default'
+    assert users.stats['errors'] == 4
+    assert users.stats['hits'] == users.stats['misses'] == 0
+
+
+def test_snapshot(cache, backend):
+    cache.namespace('users').get(1)
+
+    assert cache.snapshot() == {
+        'backend': backend.name,
+        'namespaces': {'users': {
+            'hits': 0, 'misses': 1, 'sets': 0, 'skipped': 0, 'invalidations': 0, 'errors': 0,
+        }},
+    }
@@ -0,0 +1,80 @@
+import gzip
+import json
+
+import pytest
+
+from app import response_compression
+from app.cache import TTLCache
+from app.compression import compress
+from app.startup import precompress_catalog
+
+
+@pytest.fixture
+def compressions(monkeypatch):
+    # (encoding, max_level) of every compress() call
+    calls = []
+
+    def recording_compress(data, encoding, level=6, max_level=False):
+        calls.append((encoding, max_level))
+        return compress(data, encoding, level, max_level)
+
+    monkeypatch.setattr('app.compression.compress', recording_compress)
+    monkeypatch.setattr(response_compression, '_memo', TTLCache(ttl=60))
+    monkeypatch.setattr(response_compression, '_precompressed', {})
+    return calls
+
+
+def get_albums(client, headers, query='', encoding='gzip', **extra):
+    return client.get(f'/api/albums{query}', headers={**headers, 'Accept-Encoding': encoding, **extra})
+
+
+def test_each_encoding_has_its_own_etag(client, headers, compressions):
+    plain = get_albums(client, headers, encoding='identity')
+    gzipped = get_albums(client, headers, encoding='gzip')
+
+    assert 'Content-Encoding' not in plain.headers
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(gzipped.data)) == plain.get_json()
+
+
+def test_revalidation_accepts_every_encodings_etag(client, headers, compressions):
+    for encoding in ('identity', 'gzip'):
+        etag = get_albums(client, headers, encoding=encoding).headers['ETag']
+
+        response = get_albums(client, headers, encoding=encoding, **{'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+
+def test_variants_are_compressed_at_the_normal_level_once(client, headers, compressions):
+    for _ in range(2):
+        get_albums(client, headers, '?fields=rank,artist')
+        get_albums(client, headers, '?min_rank=2')
+
+    assert compressions == [('gzip', False), ('gzip', False)]
+
+
+def test_the_precompressed_catalog_is_served_as_it_is(app, client, headers, compressions):
+    precompress_catalog(app)
+    assert all(max_level for _, max_level in compressions)
+    del compressions[:]
+
+    response = get_albums(client, headers)
+
+    assert compressions == []
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == get_albums(client, headers, encoding='identity').get_json()
+    # Anything else is compressed as usual
+    get_albums(client, headers, '?limit=10')
+    assert compressions == [('gzip', False)]
+
+
+def test_metrics_include_compression(app):
+    hooks = app.after_request_funcs[None]
+
+    # Run last-registered first
+    assert hooks.index(response_compression.compress_response) > hooks.index(
+        app.extensions['request_metrics']._finish_request
+    )
@@ -0,0 +1,35 @@
+import os
+
+from app.metrics import RequestMetrics
+
+
+def worker(directory, requests):
+    metrics = RequestMetrics()
+    metrics.directory = str(directory)
+    for _ in range(requests):
+        metrics.registry.record('albums.get_albums', 'GET', 200, 0.01, 0, 0.0, False)
+    metrics.flush()
+    return metrics
+
+
+def request_count(metrics):
+    return metrics.collect()['requests']['albums.get_albums|GET|200']['count']
+
+
+def test_collect_adds_up_every_worker(tmp_path):
+    worker(tmp_path, 2)
+    metrics = worker(tmp_path, 3)
+
+    metrics.flush()
+
+    assert request_count(metrics) == 5
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_a_respawned_worker_with_a_recycled_pid_keeps_the_old_totals(tmp_path):
+    # Both "workers" run in this process, so they have the same pid
+    worker(tmp_path, 2)
+
+    respawned = worker(tmp_path, 1)
+
+    assert request_count(respawned) == 3
@@ -0,0 +1,32 @@
+from werkzeug.security import generate_password_hash
+
+from app import db, password_hasher
+from app.models import User
+
+
+def test_needs_rehash_compares_with_the_configured_method(monkeypatch):
+    current = generate_password_hash('secret', password_hasher.method)
+    older = generate_password_hash('secret', 'pbkdf2:sha256:500')
+
+    def no_hashing(*args):
+        raise AssertionError('needs_rehash must not hash')
+
+    # The prefix was worked out by init_app, not on the request
+    monkeypatch.setattr('app.passwords.generate_password_hash', no_hashing)
+    assert not password_hasher.needs_rehash(current)
+    assert password_hasher.needs_rehash(older)
+
+
+def test_login_upgrades_an_old_hash(app, client, make_user):
+    make_user('listener')
+    with app.app_context():
+        user = User.query.filter_by(username='listener').one()
+        user.password_hash = generate_password_hash('password123', 'pbkdf2:sha256:500')
+        db.session.commit()
+
+    response = client.post('/api/auth/login', json={'username': 'listener', 'password': 'password123'})
+
+    assert response.status_code == 200
+    with app.app_context():
+        stored = User.query.filter_by(username='listener').one().password_hash
+    assert not password_hasher.needs_rehash(stored)
@@ -0,0 +1,121 @@
+import pytest
+from flask import Blueprint, Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.cache import gcra
+from app.rate_limit import RateLimiter, parse_budget
+from tests.test_cache import local_backend, redis_backend, shared_backend
+
+
+def test_parse_budget():
+    assert parse_budget('10/60') == (10, 60.0)
+    assert parse_budget('5') == (5, 1.0)
+    for spec in ('0/60', '10/0', 'ten/60'):
+        with pytest.raises(ValueError):
+            parse_budget(spec)
+
+
+def test_gcra_allows_a_burst_then_one_per_interval():
+    tat = None
+    for _ in range(3):
+        tat, wait = gcra(tat, 100.0, 10.0, 3)
+        assert wait == 0.0
+
+    assert gcra(tat, 100.0, 10.0, 3) == (None, 10.0)
+    # One token back after one interval, and only one
+    tat, wait = gcra(tat, 110.0, 10.0, 3)
+    assert wait == 0.0
+    assert gcra(tat, 110.0, 10.0, 3) == (None, 10.0)
+
+
+def test_gcra_refills_to_burst_and_no_further():
+    tat, _ = gcra(None, 100.0, 10.0, 3)
+
+    # Long idle: the bucket is full again, not fuller
+    tat, _ = gcra(tat, 1000.0, 10.0, 3)
+    assert tat == 1010.0
+
+
+@pytest.mark.parametrize('make_backend', [local_backend, shared_backend, redis_backend], ids=['local', 'shared', 'redis'])
+def test_backend_throttle(make_backend, tmp_path):
+    backend = make_backend(tmp_path)
+
+    assert [backend.throttle('bucket', 60.0, 2) for _ in range(2)] == [0.0, 0.0]
+    assert 59 < backend.throttle('bucket', 60.0, 2) <= 60
+    assert backend.throttle('other', 60.0, 2) == 0.0
+
+
+@pytest.fixture
+def limited_app(app):
+    # A bare app sharing the suite's cache, with one limited blueprint
+    limited = Flask('limited')
+    limited.config.update(
+        JWT_SECRET_KEY='test-secret-key-of-at-least-32-bytes',
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMITS={'writes': '2/60', 'unlimited': ''},
+        RATE_LIMIT_TRUSTED_PROXIES=1,
+    )
+    JWTManager(limited)
+    for name in ('writes', 'unlimited'):
+        blueprint = Blueprint(name, __name__, url_prefix=f'/{name}')
+        blueprint.add_url_rule('/', 'write', lambda: 'ok', methods=['GET', 'POST'])
+        limited.register_blueprint(blueprint)
+    RateLimiter(limited)
+    return limited
+
+
+def test_rate_limiter_answers_an_empty_bucket_with_429(limited_app):
+    client = limited_app.test_client()
+
+    assert [client.post('/writes/').status_code for _ in range(2)] == [200, 200]
+    response = client.post('/writes/')
+
+    assert response.status_code == 429
+    # 2/60 gives a token back every 30 seconds
+    assert 29 <= int(response.headers['Retry-After']) <= 30
+    # Reads and unlimited blueprints don't count
+    assert client.get('/writes/').status_code == 200
+    assert client.post('/unlimited/').status_code == 200
+
+
+def test_rate_limiter_keeps_a_bucket_per_user_and_per_ip(limited_app):
+    client = limited_app.test_client()
+    with limited_app.app_context():
+        first, second = (
+            {'Authorization': f'Bearer {create_access_token(identity=user)}'} for user in ('1', '2')
+        )
+
+    statuses = [client.post('/writes/', headers=first).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert client.post('/writes/', headers=second).status_code == 200
+    # Without a token, the address the trusted proxy saw
+    for _ in range(2):
+        client.post('/writes/', headers={'X-Forwarded-For': '10.0.0.1'})
+    assert client.post('/writes/', headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 429
+    assert client.post('/writes/', headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 200
+    # A bad token counts against the IP rather than failing the request
+    assert client.post('/writes/', headers={
+        'Authorization': 'Bearer nonsense', 'X-Forwarded-For': '10.0.0.1',
+    }).status_code == 429
+
+
+def test_rate_limiter_separates_clients_behind_one_proxy(limited_app):
+    # Every request arrives from the proxy, which appends the client address
+    client = limited_app.test_client()
+    client.environ_base['REMOTE_ADDR'] = '169.254.1.1'
+
+    def post(forwarded_for):
+        return client.post('/writes/', headers={'X-Forwarded-For': forwarded_for}).status_code
+
+    assert [post('203.0.113.7') for _ in range(3)] == [200, 200, 429]
+    assert [post('198.51.100.4') for _ in range(2)] == [200, 200]
+    # Addresses a client puts in the header itself come before the proxy's
+    assert post('198.51.100.99, 203.0.113.7') == 429
+
+
+def test_rate_limiter_disabled(app):
+    disabled = Flask('disabled')
+    disabled.config.update(RATE_LIMIT_ENABLED=False, RATE_LIMITS={'writes': '1/60'}, RATE_LIMIT_TRUSTED_PROXIES=0)
+    RateLimiter(disabled)
+
+    assert disabled.before_request_funcs == {}
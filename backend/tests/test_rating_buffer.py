@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import rating_buffer
+from app.models import UserRating
+from app.queries import apply_rating_batch, rebuild_album_stats
+
+
+@pytest.fixture
+def buffered(app, monkeypatch):
+    # The flusher thread waits out the interval, so only the test flushes
+    monkeypatch.setattr(rating_buffer, 'enabled', True)
+    monkeypatch.setattr(rating_buffer, 'interval', 3600)
+    monkeypatch.setattr(rating_buffer, 'stats', dict.fromkeys(rating_buffer.stats, 0))
+    yield rating_buffer
+    # Leftovers would otherwise be written into the next test
+    rating_buffer._pending.clear()
+
+
+def rate(client, headers, album_id, rating):
+    return client.post('/api/ratings', json={'album_id': album_id, 'rating': rating}, headers=headers)
+
+
+def fail(batch):
+    raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+
+def stored_ratings(app):
+    with app.app_context():
+        return {(rating.user_id, rating.album_id): rating.rating for rating in UserRating.query.all()}
+
+
+def test_ratings_are_queued_and_coalesced(app, client, headers, buffered):
+    responses = [rate(client, headers, 10, rating) for rating in (1, 2, 5)]
+    rate(client, headers, 9, 3)
+
+    assert [response.status_code for response in responses] == [202] * 3
+    assert responses[0].get_json()['pending'] is True
+    assert stored_ratings(app) == {}
+    assert buffered.snapshot() == {
+        'queued': 4, 'coalesced': 2, 'written': 0, 'flushes': 0, 'errors': 0, 'pending': 2,
+    }
+
+
+def test_reads_flush_the_users_own_ratings(app, client, make_user, buffered):
+    listener, other = make_user('listener'), make_user('other')
+    rate(client, listener, 10, 2)
+    rate(client, listener, 10, 4)
+    rate(client, other, 9, 5)
+
+    ratings = client.get('/api/ratings', headers=listener).get_json()['ratings']
+
+    assert [(rating['album_id'], rating['rating']) for rating in ratings] == [(10, 4)]
+    # Only the reader's ratings were written
+    assert list(stored_ratings(app).values()) == [4]
+    assert buffered.snapshot()['pending'] == 1
+
+
+def test_flush_writes_every_user_in_one_batch(app, client, make_user, buffered):
+    listener, other = make_user('listener'), make_user('other')
+    rate(client, listener, 10, 5)
+    rate(client, other, 10, 1)
+    rate(client, other, 9, 2)
+
+    buffered.flush()
+
+    assert sorted(stored_ratings(app).values()) == [1, 2, 5]
+    assert client.get('/api/albums/10/stats', headers=listener).get_json()['average_rating'] == 3.0
+    with app.app_context():
+        assert rebuild_album_stats(apply=False) == {}
+    assert buffered.snapshot() == {
+        'queued': 3, 'coalesced': 0, 'written': 3, 'flushes': 1, 'errors': 0, 'pending': 0,
+    }
+
+
+def test_rerating_with_the_stored_value_writes_nothing(app, client, headers, buffered):
+    rate(client, headers, 10, 4)
+    buffered.flush()
+
+    rate(client, headers, 10, 4)
+    buffered.flush()
+
+    assert buffered.stats['written'] == 1
+    assert len(stored_ratings(app)) == 1
+
+
+def test_a_failed_flush_keeps_the_batch(app, client, headers, buffered, monkeypatch):
+    monkeypatch.setattr('app.queries.apply_rating_batch', fail)
+    rate(client, headers, 10, 2)
+    buffered.flush()
+
+    assert buffered.snapshot()['pending'] == 1
+    assert buffered.stats['errors'] == 1
+    # A newer rating queued meanwhile wins over the one put back
+    rate(client, headers, 10, 5)
+    monkeypatch.setattr('app.queries.apply_rating_batch', apply_rating_batch)
+    buffered.flush()
+    assert list(stored_ratings(app).values()) == [5]
+
+
+def test_a_failed_flush_fails_the_read_that_needed_it(app, client, headers, buffered, monkeypatch):
+    rate(client, headers, 10, 2)
+    monkeypatch.setattr('app.queries.apply_rating_batch', fail)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+
+    assert client.get('/api/ratings', headers=headers).status_code == 500
+    assert buffered.snapshot()['pending'] == 1
@@ -0,0 +1,123 @@
+import pytest
+
+from app import db
+from app.models import AlbumStats, UserRating, UserStats
+from app.queries import rebuild_album_stats
+
+
+def album_stats(client, headers, album_id):
+    return client.get(f'/api/albums/{album_id}/stats', headers=headers).get_json()
+
+
+def test_submit_rating(app, client, headers):
+    response = client.post('/api/ratings', json={'album_id': 5, 'rating': 4}, headers=headers)
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert UserRating.query.one().rating == 4
+
+
+def test_submit_rating_accepts_numeric_string_id(app, client, headers):
+    response = client.post('/api/ratings', json={'album_id': '5', 'rating': 4}, headers=headers)
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert UserRating.query.one().album_id == 5
+
+
+@pytest.mark.parametrize('rating', [0, 6, 2.5, '3', True, False])
+def test_submit_rating_rejects_invalid_ratings(client, headers, rating):
+    response = client.post('/api/ratings', json={'album_id': 5, 'rating': rating}, headers=headers)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('album_id', [9999, [5], {'id': 5}, True, '5x'])
+def test_submit_rating_unknown_album(client, headers, album_id):
+    response = client.post('/api/ratings', json={'album_id': album_id, 'rating': 3}, headers=headers)
+
+    assert response.status_code == 404
+
+
+def test_complete_and_rate_rejects_bool_rating(client, headers, start_at):
+    start_at(10)
+
+    response = client.post('/api/progress/complete-and-rate', json={'album_id': 10, 'rating': True}, headers=headers)
+
+    assert response.status_code == 400
+
+
+def test_import_ratings(app, client, headers):
+    response = client.post('/api/ratings/import', json={'ratings': [
+        {'rank': 10, 'rating': 4},
+        {'album_id': 3, 'rating': 5},
+        {'rank': 10, 'rating': 2},
+    ]}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 2
+    with app.app_context():
+        assert {rating.album_id: rating.rating for rating in UserRating.query.all()} == {10: 2, 3: 5}
+
+
+@pytest.mark.parametrize('body', [
+    [{'rank': 10, 'rating': 4}],
+    {'ratings': []},
+    {'ratings': 'all of them'},
+    {'ratings': [{'album_id': [10], 'rating': 4}]},
+    {'ratings': [{'rank': {'rank': 10}, 'rating': 4}]},
+    {'ratings': [{'rank': True, 'rating': 4}]},
+    {'ratings': [{'rank': 10, 'rating': True}]},
+    {'ratings': [{'rank': 10}]},
+    {'ratings': [{'rating': 4}]},
+    {'ratings': ['rank 10']},
+])
+def test_import_rejects_malformed_input(app, client, headers, body):
+    response = client.post('/api/ratings/import', json=body, headers=headers)
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert UserRating.query.count() == 0
+
+
+def test_import_rejects_the_whole_batch(app, client, headers):
+    response = client.post('/api/ratings/import', json={'ratings': [
+        {'rank': 10, 'rating': 4},
+        {'rank': 9999, 'rating': 4},
+    ]}, headers=headers)
+
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1]
+    with app.app_context():
+        assert UserRating.query.count() == 0
+
+
+def test_album_stats_follow_every_write_path(app, client, make_user, start_at, headers):
+    # headers is the user start_at initializes; a second user rates too
+    other = make_user('other')
+    start_at(10)
+
+    client.post('/api/ratings', json={'album_id': 10, 'rating': 5}, headers=headers)
+    client.post('/api/ratings', json={'album_id': 10, 'rating': 3}, headers=headers)
+    client.post('/api/ratings', json={'album_id': 10, 'rating': 3}, headers=headers)
+    client.post('/api/progress/complete-and-rate', json={'album_id': 10, 'rating': 4}, headers=headers)
+    client.post('/api/ratings', json={'album_id': 10, 'rating': 1}, headers=other)
+    client.post('/api/ratings/import', json={'ratings': [
+        {'album_id': 9, 'rating': 2}, {'album_id': 10, 'rating': 5},
+    ]}, headers=other)
+    client.post('/api/sync', json={'actions': [
+        {'id': 'a', 'type': 'complete', 'album_id': 9, 'rating': 4},
+        {'id': 'b', 'type': 'rate', 'album_id': 8, 'rating': 1},
+    ]}, headers=headers)
+
+    assert album_stats(client, headers, 10) == {
+        'album_id': 10, 'rating_count': 2, 'average_rating': 4.5,
+        'histogram': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1},
+    }
+    assert album_stats(client, headers, 9)['histogram'] == {'1': 0, '2': 1, '3': 0, '4': 1, '5': 0}
+    with app.app_context():
+        # The deltas add up to what a rebuild from user_ratings gives
+        assert rebuild_album_stats(apply=False) == {}
+        assert db.session.get(AlbumStats, 8).rating_count == 1
+        user_stats = {stats.user_id: (stats.rated_count, stats.rating_sum) for stats in UserStats.query.all()}
+    assert sorted(user_stats.values()) == [(2, 7), (3, 9)]
@@ -0,0 +1,210 @@
+from datetime import datetime
+
+from app.models import SyncAction, UserProgress, UserRating
+from app.routes import MAX_LOOKAHEAD
+
+
+def sync(client, headers, *actions, lookahead=0):
+    return client.post('/api/sync', json={'actions': list(actions), 'lookahead': lookahead}, headers=headers)
+
+
+def complete(key, album_id, **extra):
+    return {'id': key, 'type': 'complete', 'album_id': album_id, **extra}
+
+
+def current_rank(client, headers):
+    return client.get('/api/progress', headers=headers).get_json()['current_album']['rank']
+
+
+def test_progress_lookahead(client, headers, start_at):
+    start_at(10)
+
+    response = client.get('/api/progress?lookahead=3', headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['current_album']['rank'] == 10
+    assert [album['rank'] for album in body['upcoming']] == [9, 8, 7]
+
+
+def test_progress_lookahead_stops_at_album_one(client, headers, start_at):
+    start_at(2)
+
+    body = client.get('/api/progress?lookahead=5', headers=headers).get_json()
+
+    assert [album['rank'] for album in body['upcoming']] == [1]
+
+
+def test_progress_lookahead_is_optional(client, headers, start_at):
+    start_at(10)
+
+    assert 'upcoming' not in client.get('/api/progress', headers=headers).get_json()
+
+
+def test_progress_lookahead_out_of_range(client, headers, start_at):
+    start_at(10)
+
+    assert client.get(f'/api/progress?lookahead={MAX_LOOKAHEAD + 1}', headers=headers).status_code == 400
+    assert client.get('/api/progress?lookahead=-1', headers=headers).status_code == 400
+    assert client.get('/api/progress?lookahead=many', headers=headers).status_code == 400
+
+
+def test_sync_applies_actions_in_order(app, client, headers, start_at):
+    start_at(10)
+
+    response = sync(
+        client, headers,
+        complete('a', 10, rating=5),
+        complete('b', 9),
+        {'id': 'c', 'type': 'rate', 'album_id': 9, 'rating': 3},
+        lookahead=2,
+    )
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['status'] for result in body['results']] == ['completed', 'completed', 'rated']
+    assert body['progress']['current_album']['rank'] == 8
+    assert [album['rank'] for album in body['progress']['upcoming']] == [7, 6]
+    with app.app_context():
+        ratings = {rating.album_id: rating.rating for rating in UserRating.query.all()}
+    assert ratings == {10: 5, 9: 3}
+
+
+def test_sync_replays_known_keys(app, client, headers, start_at):
+    start_at(10)
+    batch = [complete('a', 10, rating=4), complete('b', 9)]
+    first = sync(client, headers, *batch).get_json()
+
+    second = sync(client, headers, *batch).get_json()
+
+    assert [result['status'] for result in second['results']] == ['completed', 'completed']
+    assert all(result['replayed'] for result in second['results'])
+    assert not any('replayed' in result for result in first['results'])
+    assert current_rank(client, headers) == 8
+    with app.app_context():
+        assert SyncAction.query.count() == 2
+
+
+def test_sync_replays_a_key_repeated_in_one_batch(client, headers, start_at):
+    start_at(10)
+
+    results = sync(client, headers, complete('a', 10), complete('a', 10)).get_json()['results']
+
+    assert results[0]['status'] == 'completed'
+    assert results[1] == {**results[0], 'replayed': True}
+    assert current_rank(client, headers) == 9
+
+
+def test_sync_completion_already_passed_keeps_rating(app, client, headers, start_at):
+    # Completed on another device in the meantime
+    start_at(10)
+    client.post('/api/progress/complete-and-rate', json={'album_id': 10}, headers=headers)
+
+    results = sync(client, headers, complete('a', 10, rating=2)).get_json()['results']
+
+    assert results[0]['status'] == 'already_completed'
+    assert current_rank(client, headers) == 9
+    with app.app_context():
+        assert UserRating.query.filter_by(album_id=10).one().rating == 2
+
+
+def test_sync_completion_from_lookahead_moves_pointer_past_it(client, headers, start_at):
+    start_at(10)
+
+    results = sync(client, headers, complete('a', 7)).get_json()['results']
+
+    assert results[0]['status'] == 'completed'
+    assert current_rank(client, headers) == 6
+
+
+def test_sync_rejects_completion_beyond_lookahead(client, headers, start_at):
+    start_at(60)
+
+    results = sync(client, headers, complete('a', 60 - MAX_LOOKAHEAD - 1)).get_json()['results']
+
+    assert results[0]['status'] == 'rejected'
+    assert current_rank(client, headers) == 60
+
+
+def test_sync_album_one_stays_put(client, headers, start_at):
+    start_at(1)
+
+    body = sync(client, headers, complete('a', 1)).get_json()
+
+    assert body['results'][0]['status'] == 'completed'
+    assert body['progress']['current_album']['rank'] == 1
+
+
+def test_sync_rejects_invalid_actions(app, client, headers, start_at):
+    start_at(10)
+
+    results = sync(
+        client, headers,
+        {'id': 'unknown-album', 'type': 'rate', 'album_id': 9999, 'rating': 3},
+        {'id': 'bad-rating', 'type': 'rate', 'album_id': 10, 'rating': 6},
+        {'id': 'bool-rating', 'type': 'rate', 'album_id': 10, 'rating': True},
+        {'id': 'bad-type', 'type': 'skip', 'album_id': 10},
+        {'id': 'bad-time', 'type': 'rate', 'album_id': 10, 'rating': 3, 'client_time': 'yesterday'},
+    ).get_json()['results']
+
+    assert [result['status'] for result in results] == ['rejected'] * 5
+    with app.app_context():
+        assert UserRating.query.count() == 0
+        # Recorded, so a retry gets the same answer
+        assert SyncAction.query.count() == 5
+
+
+def test_sync_without_progress(app, client, headers):
+    body = sync(
+        client, headers, complete('a', 10), {'id': 'b', 'type': 'rate', 'album_id': 10, 'rating': 4},
+    ).get_json()
+
+    assert [result['status'] for result in body['results']] == ['rejected', 'rated']
+    assert body['progress'] == {'needs_onboarding': True}
+    with app.app_context():
+        assert UserProgress.query.count() == 0
+
+
+def test_sync_dates_new_ratings_by_client_time(app, client, headers, start_at):
+    start_at(10)
+
+    sync(
+        client, headers,
+        complete('a', 10, rating=4, client_time='2026-01-01T10:00:00+02:00'),
+        {'id': 'b', 'type': 'rate', 'album_id': 9, 'rating': 4, 'client_time': '2999-01-01T00:00:00Z'},
+    )
+
+    with app.app_context():
+        created = {rating.album_id: rating.created_at for rating in UserRating.query.all()}
+    assert created[10] == datetime(2026, 1, 1, 8, 0)
+    # A clock running ahead can't date a rating in the future
+    assert created[9] <= datetime.utcnow()
+
+
+def test_sync_validates_the_batch(client, headers, start_at):
+    start_at(10)
+
+    assert client.post('/api/sync', json=[], headers=headers).status_code == 400
+    assert client.post('/api/sync', json={'actions': {}}, headers=headers).status_code == 400
+    assert sync(client, headers, {'type': 'complete', 'album_id': 10}).status_code == 400
+    assert sync(client, headers, complete('x' * 65, 10)).status_code == 400
+    assert sync(client, headers, complete('a', 10), lookahead=MAX_LOOKAHEAD + 1).status_code == 400
+    assert current_rank(client, headers) == 10
+
+
+def test_sync_is_one_transaction(app, client, headers, start_at, monkeypatch):
+    start_at(10)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    # The rating write comes after the pointer moved and before the keys
+    # are stored; failing it must leave neither behind
+    monkeypatch.setattr('app.routes.import_user_ratings', fail)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+    response = sync(client, headers, complete('a', 10, rating=4))
+
+    assert response.status_code == 500
+    assert current_rank(client, headers) == 10
+    with app.app_context():
+        assert SyncAction.query.count() == 0
@@ -1,26 +1,56 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from '../utils/axiosConfig';
 import { useAuth } from '../contexts/AuthContext';
+import { enqueueAction, flushQueue, pendingActions } from '../utils/syncQueue';
 import AlbumRating from './AlbumRating';
 import './CurrentAlbum.css';
 
+// Albums fetched ahead of the current one, so completing them can carry on
+// without a connection
+const LOOKAHEAD = 10;
+
 const CurrentAlbum = () => {
   const [currentAlbum, setCurrentAlbum] = useState(null);
+  const [upcoming, setUpcoming] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [showRating, setShowRating] = useState(false);
   const [completing, setCompleting] = useState(false);
+  const [communityStats, setCommunityStats] = useState(null);
   const { isAuthenticated } = useAuth();
   const navigate = useNavigate();
+  // For responses that arrive after the user has moved on
+  const currentAlbumId = useRef(null);
+  currentAlbumId.current = currentAlbum?.id;
+
+  // Takes the server's progress (from /api/progress or /api/sync) unless
+  // more actions were queued since it was read, which it doesn't reflect yet
+  const applyProgress = (progress) => {
+    if (!progress || pendingActions().length) return;
+
+    if (progress.needs_onboarding) {
+      navigate('/onboarding');
+    } else if (progress.all_completed) {
+      navigate('/celebration');
+    } else {
+      setCurrentAlbum(progress.current_album);
+      setUpcoming(progress.upcoming || []);
+      setError(null);
+    }
+  };
 
   const fetchCurrentAlbum = async () => {
     if (!isAuthenticated) return;
     
     try {
       setLoading(true);
-      const response = await axios.get('/api/progress');
+      // Anything completed offline goes first, so the server's pointer is
+      // where this device left it
+      await flushQueue();
+      const response = await axios.get(`/api/progress?lookahead=${LOOKAHEAD}`);
       setCurrentAlbum(response.data.current_album);
+      setUpcoming(response.data.upcoming || []);
       setError(null);
     } catch (err) {
       // Check if user needs onboarding
@@ -39,35 +69,128 @@ const CurrentAlbum = () => {
     fetchCurrentAlbum();
   }, [isAuthenticated]);
 
-  const handleComplete = async () => {
-    setCompleting(true);
+  useEffect(() => {
+    const handleOnline = async () => {
+      const { data } = await flushQueue(LOOKAHEAD);
+      applyProgress(data?.progress);
+    };
+    window.addEventListener('online', handleOnline);
+    return () => window.removeEventListener('online', handleOnline);
+  }, []);
+
+  useEffect(() => {
+    if (!currentAlbum) return;
+
+    setCommunityStats(null);
+    axios.get(`/api/albums/${currentAlbum.id}/stats`)
+      .then((response) => setCommunityStats(response.data))
+      .catch((err) => console.error('Error fetching community rating:', err));
+  }, [currentAlbum?.id]);
+
+  const handleComplete = () => {
+    setShowRating(true);
+  };
+
+  // Tops the lookahead up again, unless the user has moved on meanwhile
+  const refreshUpcoming = async () => {
     try {
-      const response = await axios.post('/api/progress/complete');
-      
-      if (response.data.all_completed) {
-        navigate('/celebration');
-      } else {
-        setShowRating(true);
+      const response = await axios.get(`/api/progress?lookahead=${LOOKAHEAD}`);
+      if (response.data.current_album?.id === currentAlbumId.current) {
+        setUpcoming(response.data.upcoming || []);
       }
     } catch (err) {
-      setError('Failed to complete album');
-      console.error('Error completing album:', err);
-    } finally {
-      setCompleting(false);
+      console.error('Error refreshing upcoming albums:', err);
+    }
+  };
+
+  // Online, rating (optional) and advancing happen in one request to
+  // complete-and-rate. Without a connection the completion is queued for
+  // /api/sync and the next album comes from the lookahead; while anything
+  // is still queued, further completions queue behind it to keep their
+  // order.
+  const completeAndRate = async (rating) => {
+    if (!pendingActions().length) {
+      try {
+        const response = await axios.post('/api/progress/complete-and-rate', {
+          album_id: currentAlbum.id,
+          rating: rating
+        });
+
+        setShowRating(false);
+        if (response.data.all_completed) {
+          navigate('/celebration');
+          return;
+        }
+        const nextAlbum = response.data.next_album;
+        const index = upcoming.findIndex((album) => album.id === nextAlbum.id);
+        const rest = index === -1 ? [] : upcoming.slice(index + 1);
+        setCurrentAlbum(nextAlbum);
+        setUpcoming(rest);
+        setError(null);
+        if (rest.length < LOOKAHEAD / 2) {
+          refreshUpcoming();
+        }
+        return;
+      } catch (err) {
+        // Already advanced elsewhere (e.g. a second tab): resync
+        if (err.response?.status === 409) {
+          setShowRating(false);
+          await fetchCurrentAlbum();
+          return;
+        }
+        if (err.response?.status === 429) {
+          setShowRating(false);
+          setError('You\'re going fast! Wait a few seconds and mark it complete again.');
+          return;
+        }
+        // With no response at all we're offline: queue it below
+        if (err.response) {
+          throw err;
+        }
+      }
+    }
+
+    enqueueAction('complete', currentAlbum.id, rating);
+    setShowRating(false);
+
+    const [nextAlbum, ...rest] = upcoming;
+    if (nextAlbum) {
+      setCurrentAlbum(nextAlbum);
+      setUpcoming(rest);
+    }
+
+    const { data, error: syncError } = await flushQueue(LOOKAHEAD);
+    if (data && !syncError && currentAlbum.rank === 1) {
+      // Album #1 has no next album; the pointer stays on it
+      navigate('/celebration');
+    } else if (data) {
+      applyProgress(data.progress);
+    }
+    if (syncError === 'rate_limited') {
+      setError('Saved. It will sync in a few seconds.');
+    } else if (syncError === 'failed') {
+      setError('Saved. It will sync next time you complete an album.');
+    } else if (syncError === 'offline' && !nextAlbum) {
+      setError(currentAlbum.rank === 1
+        ? 'Saved. Reconnect to finish your journey!'
+        : 'Saved. Reconnect to load the next album.');
     }
   };
 
   const handleRatingSubmit = async (rating) => {
+    await completeAndRate(rating);
+  };
+
+  const handleSkipRating = async () => {
+    setCompleting(true);
     try {
-      await axios.post('/api/ratings', {
-        album_id: currentAlbum.id,
-        rating: rating
-      });
-      
-      setShowRating(false);
-      await fetchCurrentAlbum();
+      await completeAndRate(null);
     } catch (err) {
-      console.error('Error submitting rating:', err);
+      setShowRating(false);
+      setError('Failed to complete album');
+      console.error('Error completing album:', err);
+    } finally {
+      setCompleting(false);
     }
   };
 
@@ -88,10 +211,7 @@ const CurrentAlbum = () => {
       <AlbumRating 
         album={currentAlbum} 
         onSubmit={handleRatingSubmit}
-        onSkip={() => {
-          setShowRating(false);
-          fetchCurrentAlbum();
-        }}
+        onSkip={handleSkipRating}
       />
     );
   }
@@ -109,6 +229,13 @@ const CurrentAlbum = () => {
         {currentAlbum.info && (
           <p className="album-info">{currentAlbum.info}</p>
         )}
+
+        {communityStats?.rating_count > 0 && (
+          <p className="community-rating">
+            Community rating: {communityStats.average_rating.toFixed(1)} ★
+            ({communityStats.rating_count} {communityStats.rating_count === 1 ? 'rating' : 'ratings'})
+          </p>
+        )}
         
         {currentAlbum.description && (
           <div className="album-description">
@@ -10,16 +10,46 @@ const Onboarding = () => {
   const [submitting, setSubmitting] = useState(false);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchAlbums();
   }, []);
 
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+    // Wait for a pause in typing, and ignore answers to superseded queries
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get('/api/albums/search', {
+          params: { q: query, limit: 50, fields: 'id,rank,artist,album' }
+        });
+        if (!cancelled) {
+          setSearchResults(response.data.results);
+        }
+      } catch (err) {
+        console.error('Error searching albums:', err);
+      }
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm]);
+
   const fetchAlbums = async () => {
     try {
       setLoading(true);
-      const response = await axios.get('/api/albums');
+      // Only the fields needed for the picker; skips the long descriptions
+      const response = await axios.get('/api/albums', {
+        params: { fields: 'id,rank,artist,album' }
+      });
       setAlbums(response.data.albums);
       setError(null);
     } catch (err) {
@@ -57,14 +87,8 @@ const Onboarding = () => {
     }
   };
 
-  const filteredAlbums = albums.filter(album => {
-    const searchLower = searchTerm.toLowerCase();
-    return (
-      album.artist.toLowerCase().includes(searchLower) ||
-      album.album.toLowerCase().includes(searchLower) ||
-      album.rank.toString().includes(searchTerm)
-    );
-  });
+  // Best matches first while searching, otherwise the whole countdown
+  const filteredAlbums = searchTerm.trim() && searchResults ? searchResults : albums;
 
   if (loading) {
     return <div className="loading">Loading albums...</div>;
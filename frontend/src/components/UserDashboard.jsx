@@ -2,35 +2,39 @@ import React, { useState, useEffect } from 'react';
 import axios from '../utils/axiosConfig';
 import './UserDashboard.css';
 
+const PAGE_SIZE = 50;
+
 const UserDashboard = () => {
   const [progress, setProgress] = useState(null);
+  const [stats, setStats] = useState(null);
   const [ratings, setRatings] = useState([]);
+  const [pagination, setPagination] = useState({ page: 1, pages: 0 });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [sortBy, setSortBy] = useState('date'); // 'date', 'rating', 'rank'
   const [filterRating, setFilterRating] = useState('all'); // 'all', '5', '4', '3', '2', '1'
+  const [page, setPage] = useState(1);
 
   useEffect(() => {
     fetchDashboardData();
-  }, []);
+  }, [sortBy, filterRating, page]);
 
   const fetchDashboardData = async () => {
     try {
       setLoading(true);
-      const token = localStorage.getItem('token');
-      
-      // Fetch user progress
-      const progressResponse = await axios.get('/api/progress', {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      
-      // Fetch user ratings
-      const ratingsResponse = await axios.get('/api/ratings', {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      
-      setProgress(progressResponse.data);
-      setRatings(ratingsResponse.data.ratings || []);
+
+      // Progress, stats and one page of ratings come back in a single call;
+      // filtering, sorting and paging all happen on the server.
+      const params = { sort: sortBy, page, per_page: PAGE_SIZE };
+      if (filterRating !== 'all') {
+        params.rating = filterRating;
+      }
+      const response = await axios.get('/api/dashboard', { params });
+
+      setProgress(response.data.progress);
+      setStats(response.data.stats);
+      setRatings(response.data.ratings || []);
+      setPagination(response.data.pagination);
       setError('');
     } catch (err) {
       setError('Failed to load dashboard data');
@@ -40,54 +44,14 @@ const UserDashboard = () => {
     }
   };
 
-  const getFilteredAndSortedRatings = () => {
-    let filtered = [...ratings];
-    
-    // Apply filter
-    if (filterRating !== 'all') {
-      filtered = filtered.filter(r => r.rating === parseInt(filterRating));
-    }
-    
-    // Apply sort
-    filtered.sort((a, b) => {
-      switch (sortBy) {
-        case 'date':
-          return new Date(b.created_at) - new Date(a.created_at);
-        case 'rating':
-          return b.rating - a.rating;
-        case 'rank':
-          return a.album.rank - b.album.rank;
-        default:
-          return 0;
-      }
-    });
-    
-    return filtered;
+  const handleSortChange = (value) => {
+    setSortBy(value);
+    setPage(1);
   };
 
-  const calculateStats = () => {
-    if (!progress) {
-      return { completed: 0, remaining: 500, avgRating: 0, percentage: 0 };
-    }
-    
-    // If all_completed flag is set, user has finished all 500
-    if (progress.all_completed) {
-      const avgRating = ratings.length > 0 
-        ? ratings.reduce((sum, r) => sum + r.rating, 0) / ratings.length 
-        : 0;
-      return { completed: 500, remaining: 0, avgRating, percentage: 100 };
-    }
-    
-    // Calculate based on current album
-    const currentRank = progress.current_album?.rank || 500;
-    const completed = 500 - currentRank;
-    const remaining = currentRank;
-    const avgRating = ratings.length > 0 
-      ? ratings.reduce((sum, r) => sum + r.rating, 0) / ratings.length 
-      : 0;
-    const percentage = (completed / 500) * 100;
-    
-    return { completed, remaining, avgRating, percentage };
+  const handleFilterChange = (value) => {
+    setFilterRating(value);
+    setPage(1);
   };
 
   const renderStars = (rating) => {
@@ -102,7 +66,7 @@ const UserDashboard = () => {
     });
   };
 
-  if (loading) {
+  if (loading && !stats) {
     return <div className="dashboard-loading">Loading dashboard...</div>;
   }
 
@@ -110,9 +74,6 @@ const UserDashboard = () => {
     return <div className="dashboard-error">{error}</div>;
   }
 
-  const stats = calculateStats();
-  const displayRatings = getFilteredAndSortedRatings();
-
   return (
     <div className="user-dashboard">
       <h1>My Music Journey</h1>
@@ -127,7 +88,7 @@ const UserDashboard = () => {
           <div className="stat-label">Albums Remaining</div>
         </div>
         <div className="stat-card">
-          <div className="stat-value">{stats.avgRating.toFixed(1)}</div>
+          <div className="stat-value">{stats.average_rating.toFixed(1)}</div>
           <div className="stat-label">Average Rating</div>
         </div>
         <div className="stat-card">
@@ -167,7 +128,7 @@ const UserDashboard = () => {
         <div className="filters-container">
           <div className="filter-group">
             <label>Sort by:</label>
-            <select value={sortBy} onChange={(e) => setSortBy(e.target.value)}>
+            <select value={sortBy} onChange={(e) => handleSortChange(e.target.value)}>
               <option value="date">Date Rated</option>
               <option value="rating">Rating</option>
               <option value="rank">Album Rank</option>
@@ -176,7 +137,7 @@ const UserDashboard = () => {
           
           <div className="filter-group">
             <label>Filter by rating:</label>
-            <select value={filterRating} onChange={(e) => setFilterRating(e.target.value)}>
+            <select value={filterRating} onChange={(e) => handleFilterChange(e.target.value)}>
               <option value="all">All Ratings</option>
               <option value="5">5 Stars</option>
               <option value="4">4 Stars</option>
@@ -187,11 +148,11 @@ const UserDashboard = () => {
           </div>
         </div>
 
-        {displayRatings.length === 0 ? (
+        {ratings.length === 0 ? (
           <p className="no-ratings">No albums rated yet. Start listening and rating!</p>
         ) : (
           <div className="ratings-grid">
-            {displayRatings.map((rating) => (
+            {ratings.map((rating) => (
               <div key={rating.id} className="rating-card">
                 <div className="rating-rank">#{rating.album.rank}</div>
                 <div className="rating-content">
@@ -204,6 +165,24 @@ const UserDashboard = () => {
             ))}
           </div>
         )}
+
+        {pagination.pages > 1 && (
+          <div className="pagination">
+            <button
+              onClick={() => setPage(page - 1)}
+              disabled={loading || page <= 1}
+            >
+              Previous
+            </button>
+            <span>Page {pagination.page} of {pagination.pages}</span>
+            <button
+              onClick={() => setPage(page + 1)}
+              disabled={loading || page >= pagination.pages}
+            >
+              Next
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,5 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import axios from '../utils/axiosConfig';
+import { clearQueue, flushQueue } from '../utils/syncQueue';
 
 const AuthContext = createContext(null);
 
@@ -95,6 +96,10 @@ export const AuthProvider = ({ children }) => {
 
   const logout = async () => {
     try {
+      // Last chance for anything completed offline; the queue isn't kept
+      // for whoever logs in next
+      await flushQueue();
+      clearQueue();
       await axios.post('/api/auth/logout');
     } catch (error) {
       console.error('Logout error:', error);
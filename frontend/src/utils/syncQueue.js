@@ -0,0 +1,108 @@
+import axios from './axiosConfig';
+
+// Completions and ratings made while offline wait here, in localStorage so
+// a reload doesn't lose them, and go to POST /api/sync in order once the
+// connection is back; online, the app uses the regular endpoints. Each
+// action carries its own id, so a batch that's sent twice, e.g. when the
+// response is lost, is only applied once.
+const STORAGE_KEY = 'syncQueue';
+const MAX_BATCH = 200;
+
+let inFlight = null;
+
+const load = () => {
+  try {
+    return JSON.parse(localStorage.getItem(STORAGE_KEY)) || [];
+  } catch {
+    return [];
+  }
+};
+
+const save = (actions) => {
+  if (actions.length) {
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(actions));
+  } else {
+    localStorage.removeItem(STORAGE_KEY);
+  }
+};
+
+const newId = () => (
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+);
+
+export const pendingActions = () => load();
+
+export const clearQueue = () => save([]);
+
+// type is 'complete' or 'rate'; rating is optional for 'complete'
+export const enqueueAction = (type, albumId, rating = null) => {
+  const action = {
+    id: newId(),
+    type,
+    album_id: albumId,
+    client_time: new Date().toISOString()
+  };
+  if (rating !== null) {
+    action.rating = rating;
+  }
+  save([...load(), action]);
+  return action;
+};
+
+// Sends the queue (MAX_BATCH at a time) and resolves to
+// { data, error }: data is the last response body ({results, progress}) or
+// null if nothing was sent; error is null, 'offline' (no response),
+// 'rate_limited' (429; retried by itself after Retry-After) or 'failed'.
+// Unsent actions stay queued for next time.
+export const flushQueue = (lookahead = 0) => {
+  if (!inFlight) {
+    inFlight = sendAll(lookahead).finally(() => {
+      inFlight = null;
+    });
+  }
+  return inFlight;
+};
+
+let retryTimer = null;
+
+const retryLater = (seconds, lookahead) => {
+  if (retryTimer) return;
+  retryTimer = setTimeout(() => {
+    retryTimer = null;
+    flushQueue(lookahead);
+  }, (seconds || 5) * 1000);
+};
+
+const sendAll = async (lookahead) => {
+  let data = null;
+  let batch = load().slice(0, MAX_BATCH);
+  while (batch.length) {
+    try {
+      const response = await axios.post('/api/sync', { actions: batch, lookahead });
+      data = response.data;
+    } catch (err) {
+      const status = err.response?.status;
+      // A rejected batch would be rejected again: drop it rather than
+      // retry it forever. Anything else is kept and retried.
+      if (status !== 400) {
+        console.error('Sync failed, will retry:', err);
+        if (!err.response) {
+          return { data, error: 'offline' };
+        }
+        if (status === 429) {
+          retryLater(Number(err.response.headers['retry-after']), lookahead);
+          return { data, error: 'rate_limited' };
+        }
+        return { data, error: 'failed' };
+      }
+      console.error('Sync batch rejected:', err.response.data);
+    }
+    // Actions queued while this batch was in flight stay in the queue
+    const sent = new Set(batch.map((action) => action.id));
+    save(load().filter((action) => !sent.has(action.id)));
+    batch = load().slice(0, MAX_BATCH);
+  }
+  return { data, error: null };
+};
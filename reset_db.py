@@ -14,6 +14,12 @@ engine = create_engine(DATABASE_URL)
 # Drop all tables
 with engine.connect() as conn:
     conn.execute(text("DROP TABLE IF EXISTS alembic_version CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS catalog_version CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS sync_actions CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS user_neighbors CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS recommendation_state CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS user_stats CASCADE"))
+    conn.execute(text("DROP TABLE IF EXISTS album_stats CASCADE"))
     conn.execute(text("DROP TABLE IF EXISTS user_ratings CASCADE"))
     conn.execute(text("DROP TABLE IF EXISTS user_progress CASCADE"))
     conn.execute(text("DROP TABLE IF EXISTS users CASCADE"))